@@ -0,0 +1,8 @@
+"""One-time process setup shared by the agent modules."""
+import os
+import config  # noqa: F401  (loads .env once for the process)
+
+# ADK warns on every use of an experimental feature (App, context caching, ...).
+# Its own switch silences just those instead of a process-wide warnings filter,
+# so deprecations from other libraries still surface.
+os.environ.setdefault("ADK_SUPPRESS_EXPERIMENTAL_FEATURE_WARNINGS", "1")
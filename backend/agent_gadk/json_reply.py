@@ -0,0 +1,103 @@
+"""Decoding of JSON card replies (vote / recommendation cards) from the agent.
+
+Kept free of ADK imports so it can be tested on its own.
+"""
+import logging
+from typing import Any, NamedTuple, Optional
+
+import orjson
+
+from agent_gadk.json_stream import IncrementalJsonParser
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = " \t\r\n"
+
+# How a reply was decoded
+SOURCE_STREAM = "stream"      # closed cleanly while the reply streamed in
+SOURCE_ORJSON = "orjson"      # full text parsed after the turn
+SOURCE_REPAIRED = "repaired"  # truncated; open strings/containers were closed off
+
+
+class ParsedReply(NamedTuple):
+    data: Any
+    source: str
+
+
+def looks_like_json(text: str) -> bool:
+    if not isinstance(text, str):
+        return False
+    # Only the leading characters matter: scan past whitespace without copying the reply
+    i, n = 0, len(text)
+    while i < n and text[i] in _WHITESPACE:
+        i += 1
+    first = text[i:i + 1]
+    return first == "{" or first == "[" or text[i:i + 7].lower() == "```json"
+
+
+def strip_json_fences(text: str) -> str:
+    # Remove single-line or multi-line ```json ... ``` fences by moving two
+    # indices inward; the only copy made is the final slice
+    lo, hi = 0, len(text)
+    while lo < hi and text[lo] in _WHITESPACE:
+        lo += 1
+    while hi > lo and text[hi - 1] in _WHITESPACE:
+        hi -= 1
+    if text[lo:lo + 7].lower() == "```json":
+        lo += 7
+    if hi - lo >= 3 and text[hi - 3:hi] == "```":
+        hi -= 3
+    while lo < hi and text[lo] in _WHITESPACE:
+        lo += 1
+    while hi > lo and text[hi - 1] in _WHITESPACE:
+        hi -= 1
+    return text[lo:hi]
+
+
+def parse_json_reply(
+    text: str,
+    session_id: Optional[str] = None,
+    parser: Optional[IncrementalJsonParser] = None,
+) -> Optional[ParsedReply]:
+    """Parse a JSON-looking reply, closing off truncated output instead of re-running the agent.
+
+    A parser that was fed the reply while it streamed already holds the document.
+    The result says which path produced it; only SOURCE_REPAIRED data may be
+    incomplete. Returns None when nothing parseable can be recovered.
+    """
+    if parser is not None and parser.value is not None:
+        return ParsedReply(parser.value, SOURCE_STREAM)
+    candidate = strip_json_fences(text)
+    try:
+        return ParsedReply(orjson.loads(candidate), SOURCE_ORJSON)
+    except orjson.JSONDecodeError as e:
+        error = str(e)
+    parser = IncrementalJsonParser()
+    parser.feed(candidate)
+    try:
+        data = parser.finalize()
+    except ValueError:
+        logger.warning("json_parse_failed", extra={"session_id": session_id, "error": error})
+        return None
+    # finalize() can still succeed without repairs, e.g. a clean object followed by prose
+    source = SOURCE_REPAIRED if parser.repaired else SOURCE_ORJSON
+    logger.warning("json_reply_recovered", extra={"session_id": session_id, "error": error, "source": source})
+    return ParsedReply(data, source)
+
+
+def is_valid_card(data: Any) -> bool:
+    """True when data is a card that validates against its agent_models schema."""
+    if not isinstance(data, dict):
+        return False
+    # Imported here so the parsing helpers above don't need pydantic
+    from pydantic import ValidationError
+    from base_models.agent_models import RecommendationResult, VoteResponse
+
+    model = {"vote_card": VoteResponse, "recommendation_card": RecommendationResult}.get(data.get("type"))
+    if model is None:
+        return False
+    try:
+        model.model_validate(data)
+    except ValidationError:
+        return False
+    return True
@@ -0,0 +1,151 @@
+from typing import Any, Optional
+
+import orjson
+
+_CLOSERS = {"{": "}", "[": "]"}
+# Characters allowed after the top-level value (whitespace and a closing ``` fence)
+_TRAILING_OK = frozenset(" \t\r\n`")
+_UNPARSED = object()
+
+
+class IncrementalJsonParser:
+    """Tracks JSON nesting across chunks so a truncated reply can be closed off.
+
+    feed() only scans the characters it is given, so the total work stays O(n)
+    however the text is chunked. The document starts at the first top-level
+    "{" or "[" (anything before it, such as a ```json fence, is skipped).
+    finalize() completes whatever is still open instead of asking the model to
+    produce the whole document again.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets everything fed so far."""
+        self._parts: list[str] = []
+        self._pos = 0
+        self._start: Optional[int] = None   # offset of the top-level "{" or "["
+        self._end: Optional[int] = None     # offset just past its matching close
+        self._stack: list[str] = []         # open containers, innermost last
+        self._expect_key: list[bool] = []   # parallel to _stack, only used for "{"
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._trailing = False              # non-fence text after the top-level value
+        self._value: Any = _UNPARSED
+        # Set by finalize() when it had to close or drop anything
+        self.repaired = False
+        # (offset, open containers) right after the last complete value
+        self._safe: tuple[int, tuple[str, ...]] = (0, ())
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """Consumes the next chunk; returns the document once its top-level value closes."""
+        if self._end is not None:
+            self._check_trailing(chunk)
+            return None
+        self._parts.append(chunk)
+        stack, expect_key = self._stack, self._expect_key
+        pos = self._pos
+        for i, ch in enumerate(chunk):
+            pos += 1
+            if self._start is None:
+                if ch in "{[":
+                    self._start = pos - 1
+                else:
+                    continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if not self._string_is_key:
+                        self._safe = (pos, tuple(stack))
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = bool(stack) and stack[-1] == "{" and expect_key[-1]
+            elif ch in "{[":
+                stack.append(ch)
+                expect_key.append(ch == "{")
+                self._safe = (pos, tuple(stack))
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+                    expect_key.pop()
+                self._safe = (pos, tuple(stack))
+                if not stack:
+                    self._pos = self._end = pos
+                    self._check_trailing(chunk[i + 1:])
+                    try:
+                        self._value = orjson.loads(self.text())
+                    except orjson.JSONDecodeError:
+                        self._value = None
+                    return self._value
+            elif ch == ",":
+                # A comma means the value before it (possibly a bare scalar) is complete
+                self._safe = (pos - 1, tuple(stack))
+                if stack and stack[-1] == "{":
+                    expect_key[-1] = True
+            elif ch == ":":
+                if stack and stack[-1] == "{":
+                    expect_key[-1] = False
+        self._pos = pos
+        return None
+
+    def _check_trailing(self, text: str) -> None:
+        if not self._trailing and any(ch not in _TRAILING_OK for ch in text):
+            self._trailing = True
+
+    @property
+    def value(self) -> Optional[Any]:
+        """The parsed document if it closed cleanly with nothing but a fence after it."""
+        if self._end is None or self._trailing or self._value is _UNPARSED:
+            return None
+        return self._value
+
+    def text(self) -> str:
+        """The document text consumed so far, up to the end of the top-level value if it closed."""
+        text = "".join(self._parts)
+        return text[self._start or 0:self._end]
+
+    def finalize(self) -> Any:
+        """Returns the document, closing any string or containers left open.
+
+        Sets `repaired` when the result is not the document exactly as fed, so
+        callers can tell a cut-off reply from a complete one. Raises ValueError
+        when not even the last complete value can be recovered.
+        """
+        self.repaired = False
+        if self._start is None:
+            raise ValueError("No JSON object or array found in the reply")
+        if self._end is not None:
+            return orjson.loads(self.text())
+
+        # First try to keep everything, then fall back to the last complete value
+        full = "".join(self._parts)
+        tail = full[self._start:]
+        if self._in_string:
+            tail += '"'
+        tail = tail.rstrip()
+        if tail.endswith(","):
+            tail = tail[:-1]
+        elif tail.endswith(":"):
+            tail += "null"
+        offset, stack = self._safe
+        for candidate, open_containers in (
+            (tail, self._stack),
+            (full[self._start:offset].rstrip(), stack),
+        ):
+            if not candidate:
+                continue
+            closing = "".join(_CLOSERS[c] for c in reversed(open_containers))
+            try:
+                value = orjson.loads(candidate + closing)
+            except orjson.JSONDecodeError:
+                continue
+            self.repaired = True
+            return value
+        raise ValueError("No complete JSON value could be recovered from the reply")
@@ -0,0 +1,15 @@
+"""Shared Gemini model instances for the agent tree."""
+from functools import lru_cache
+
+from google.adk.models import Gemini
+
+
+@lru_cache(maxsize=None)
+def gemini(model: str) -> Gemini:
+    """Returns one Gemini instance per model name.
+
+    An agent given a plain model string builds a new Gemini (and with it a new
+    genai client and connection pool) on every LLM call. Passing these shared
+    instances keeps one client, and its warm connections, per model.
+    """
+    return Gemini(model=model)
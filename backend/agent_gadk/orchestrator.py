@@ -1,237 +1,406 @@
-import re, json, warnings, logging, os, sys, uuid
-from dotenv import load_dotenv
+import agent_gadk._setup  # noqa: F401
+import re, logging, os, hashlib
 from google.adk.agents import Agent
 from google.adk.runners import Runner
+from google.adk.apps import App
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types
 from agent_gadk.sub_agents.vote_card import pipeline_vote_agent
 from agent_gadk.sub_agents.recommendation_card import pipeline_recommendation_agent
-from config import GEMINI_PRO, GEMINI_FLASH
-from agent_gadk.tools import distance_matrix, google_places_text_search
-from google.adk.sessions import InMemorySessionService
-import asyncio, traceback
+from config import ROOT_MODEL, CONTEXT_CACHE_TTL_SECONDS, CONTEXT_CACHE_INTERVALS, SESSION_DB_URL, REPLY_CACHE_TTL_SECONDS
+from agent_gadk.tools import distance_matrix, google_places_text_search, google_places_text_search_batch
+from agent_gadk.models import gemini
+from agent_gadk.json_stream import IncrementalJsonParser
+from agent_gadk.json_reply import SOURCE_REPAIRED, is_valid_card, looks_like_json, parse_json_reply
+from agent_gadk.session_pool import SessionPool
+import asyncio, weakref
+import orjson
+from cachetools import TTLCache
+from contextlib import aclosing
+from typing import AsyncIterator, Callable
+from functools import lru_cache
+from pathlib import Path
 
-warnings.filterwarnings("ignore")
+logger = logging.getLogger(__name__)
 
-load_dotenv(override=True)
+@lru_cache(maxsize=1)
+def _root_instruction() -> str:
+    return (Path(__file__).parent / "prompts" / "root_instruction.md").read_text(encoding="utf-8")
 
-logger = logging.getLogger(__name__)
 gen_cfg = types.GenerateContentConfig(
     temperature=0.1,
 )
 
 root_agent = Agent(
     name="root_agent",
-    model=GEMINI_PRO,
+    model=gemini(ROOT_MODEL),
     description="Your name is Burpla. The main coordinator agent. Handles places-to-eat request, distance request, web search, and delegate vote generation to specialists",
-    instruction="""
-        Your name is Burpla. You are the main Food Recommendation Agent coordinating a team.
-        Your primary responsibility is to provide food place recommendations, distance information, and generate vote requests, and answer other general questions.
-
-        IMPORTANT:
-        * If you see the note: THIS IS A NON-AGENT QUERY, DO NOT RESPOND TO THE USER, don't respond to the user at all. But remember the conversation for future context.
-        * Otherwise, follow the instructions below carefully.
-
-        **Tools Available:**
-        1. distance_matrix: Calculate distances between locations
-        2. google_places_text_search: Find places to eat based on user queries. Only use it when the user want more information about a particular place
-
-        **Sub-Agents Available:**
-        1. pipeline_vote_agent: Creates detailed voting polls from conversation history
-        2. pipeline_recommendation_agent: Generates recommendation cards from search results
-
-        **How to Handle Requests:**
-
-        1. **Finding Restaurants:**
-           - Use 'google_places_text_search' tool to search for restaurants if user ask more information about a place. "What time does Pho Dien close, what is the review of Sapa restaurant
-
-        2. **Distance Calculations:**
-           - Use 'distance_matrix' tool
-           - Provide distance and estimated travel time base on transportation mode (driving, walking, etc.)
-
-        3. Recommendation
-        - When user asks for "Find me", "recommendations", "suggestions", "places to eat", "where should I eat", etc.
-              - IMMEDIATELY delegate to 'pipeline_recommendation_agent' sub-agent
-                - DO NOT respond yourself - just transfer to the pipeline_recommendation_agent
-                - The pipeline will:
-                    * Use google_places_text_search to find relevant restaurants
-                    * Generate a recommendation card with photos and details
-                - Simply return the pipeline's output to the user
-
-        4. **Creating Votes (CRITICAL):**
-           - When user asks to "create a vote", "generate vote", "make a poll", "start a vote", etc.
-           - IMMEDIATELY delegate to 'pipeline_vote_agent' sub-agent
-           - DO NOT respond yourself - just transfer to the pipeline_vote_agent
-           - The pipeline will:
-             * Analyze conversation history to identify restaurants
-             * Find place IDs for those restaurants
-             * Generate a complete vote card with photos and details
-           - Simply return the pipeline's output to the user
-
-
-        5. **General Conversation:**
-           - If no tools or sub-agents are needed, respond directly to the user based on your knowledge.
-
-        **Important:**
-        - When user requests a vote, or recommendation immediately transfer to pipeline_vote_agent (don't try to handle it yourself)
-        - The pipeline has access to full conversation history
-        - The sub-agents must be in json executable format
-        - Don't make up any information. If unsure, can ask the user for clarification.
-        """,
-    tools=[google_places_text_search, distance_matrix],
+    instruction=_root_instruction(),
+    tools=[google_places_text_search, google_places_text_search_batch, distance_matrix],
     generate_content_config=gen_cfg,
     sub_agents=[pipeline_vote_agent, pipeline_recommendation_agent],
 )
 
-# session_service = InMemorySessionService()
+# Built on first agent call so health checks and cold starts skip the SQLAlchemy import
+session_service = None
 
-from google.adk.sessions import DatabaseSessionService
-# Example using a local SQLite file:
-db_url = "sqlite:///./my_agent_data.db"
-session_service = DatabaseSessionService(db_url=db_url)\
+def _get_session_service():
+    global session_service
+    if session_service is None:
+        from agent_gadk.session_service import TrimmingSessionService
 
-created_sessions = set()
+        session_service = TrimmingSessionService(db_url=SESSION_DB_URL)
+    return session_service
 
-async def call_agent_async(
+# Bounded LRU of sessions known to exist in session_service
+MAX_CREATED_SESSIONS = 10_000
+session_pool = SessionPool(_get_session_service, maxsize=MAX_CREATED_SESSIONS)
+# Raw agent replies keyed by (app_name, session_id, normalized query digest)
+# Only absorbs duplicate resends: a hit is not sent to the agent, so that turn is
+# not added to the ADK session history (the original turn already is)
+MAX_REPLY_CACHE = 1024
+_reply_cache: "TTLCache[tuple[str, str, str], str]" = TTLCache(maxsize=MAX_REPLY_CACHE, ttl=REPLY_CACHE_TTL_SECONDS)
+# Weak values let locks for idle sessions be collected
+_session_locks: "weakref.WeakValueDictionary[tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+_SSE_RUN_CONFIG = RunConfig(streaming_mode=StreamingMode.SSE)
+
+# Per-event tracing is checked once here rather than on every event
+_DEBUG_EVENTS = os.getenv("ADK_DEBUG_EVENTS") == "1"
+
+# Caps concurrent agent turns so batch fan-out stays within Gemini quota
+_LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "16")))
+
+def _final_text(event) -> str | None:
+    """Extract the reply text from a final-response event, if any."""
+    if event.content and event.content.parts:
+        for part in event.content.parts:
+            if hasattr(part, "text") and part.text:
+                return part.text
+    elif event.actions and event.actions.escalate:
+        return f"Agent escalated: {event.error_message or 'No specific message.'}"
+    return None
+
+async def _stream_events(runner, user_id, session_id, content, run_config, on_turn_end=None):
+    streamed = False
+    events = runner.run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=content,
+        run_config=run_config or RunConfig(),
+    )
+    # aclosing() shuts the generator down as soon as we break on the final
+    # response, releasing its HTTP connection instead of waiting for GC
+    async with aclosing(events):
+        async for event in events:
+            if _DEBUG_EVENTS:
+                logger.debug("adk_event", extra={"session_id": session_id, "author": getattr(event, "author", "?")})
+            event_content = event.content
+            parts = event_content.parts if event_content and event_content.parts else ()
+            # Partial events only arrive when run_config enables SSE streaming
+            if event.partial:
+                for part in parts:
+                    if part.text:
+                        streamed = True
+                        yield part.text
+                continue
+            if event.is_final_response():
+                text = _final_text(event)
+                # The final event repeats the aggregated text of the partial chunks
+                if text and not streamed:
+                    yield text
+                break
+            # An aggregated non-final event (e.g. a tool call) closes the streamed turn
+            if streamed and on_turn_end is not None:
+                on_turn_end()
+            streamed = False
+
+async def stream_agent_async(
     query: str,
     runner,
     user_id,
     session_id,
-):
+    run_config: RunConfig | None = None,
+    on_turn_end: Callable[[], None] | None = None,
+) -> AsyncIterator[str]:
+    """Yield the agent's reply text as it arrives.
+
+    Without an SSE run_config the final response is yielded as a single chunk.
+    on_turn_end is called when text already streamed turns out to belong to an
+    intermediate turn (one that ended in a tool call or transfer).
+    """
     content = types.Content(role="user", parts=[types.Part(text=query)])
-    final_response_text = "Agent did not produce a final response."
 
     try:
-        async for event in runner.run_async(
-            user_id=user_id, session_id=session_id, new_message=content
-        ):
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    for part in event.content.parts:
-                        if hasattr(part, "text") and part.text:
-                            final_response_text = part.text.strip()
-                            break
-                elif event.actions and event.actions.escalate:
-                    final_response_text = (
-                        f"Agent escalated: {event.error_message or 'No specific message.'}"
-                    )
-                break
+        async for chunk in _stream_events(runner, user_id, session_id, content, run_config, on_turn_end):
+            yield chunk
     except ValueError as e:
         error_msg = str(e)
         if "Session not found" in error_msg:
-            logger.error(f"❌ Session not found: {session_id}. Error: {error_msg}")
+            logger.error("session_not_found", extra={"session_id": session_id, "error": error_msg})
             # Try to recreate the session and retry once
             try:
-                await session_service.create_session(
+                await _get_session_service().create_session(
                     app_name=runner.app_name, user_id=user_id, session_id=session_id
                 )
-                logger.info(f"🔄 Recreated session {session_id}, retrying...")
-                # Retry the call
-                async for event in runner.run_async(
-                    user_id=user_id, session_id=session_id, new_message=content
-                ):
-                    if event.is_final_response():
-                        if event.content and event.content.parts:
-                            for part in event.content.parts:
-                                if hasattr(part, "text") and part.text:
-                                    final_response_text = part.text.strip()
-                                    break
-                        elif event.actions and event.actions.escalate:
-                            final_response_text = (
-                                f"Agent escalated: {event.error_message or 'No specific message.'}"
-                            )
-                        break
+                logger.info("session_recreated", extra={"session_id": session_id})
             except Exception as retry_error:
-                logger.error(f"❌ Failed to recreate session {session_id}: {retry_error}")
+                logger.error("session_recreate_failed", extra={"session_id": session_id, "error": str(retry_error)})
                 raise ValueError(f"Session {session_id} not found and could not be recreated: {retry_error}")
+            async for chunk in _stream_events(runner, user_id, session_id, content, run_config, on_turn_end):
+                yield chunk
         else:
             # Re-raise if it's a different ValueError
             raise
-    except Exception as e:
-        logger.error(f"❌ Unexpected error in call_agent_async for session {session_id}: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+    except Exception:
+        logger.exception("stream_agent_failed", extra={"session_id": session_id})
         raise
 
-    return final_response_text
+# Reply used when the agent ends its turn without any text
+_NO_FINAL_RESPONSE = "Agent did not produce a final response."
+
+async def call_agent_async(
+    query: str,
+    runner,
+    user_id,
+    session_id,
+    run_config: RunConfig | None = None,
+    parser: IncrementalJsonParser | None = None,
+):
+    """Collect the agent's reply; chunks are fed to parser (if given) as they arrive."""
+    chunks = []
+
+    def _drop_intermediate_turn():
+        # Only the final turn is the reply
+        chunks.clear()
+        if parser is not None:
+            parser.reset()
+
+    async for chunk in stream_agent_async(
+        query, runner, user_id, session_id, run_config, _drop_intermediate_turn
+    ):
+        chunks.append(chunk)
+        if parser is not None:
+            parser.feed(chunk)
+    return "".join(chunks).strip() or _NO_FINAL_RESPONSE
+
+
+# Bare greetings get a canned intro without a model call. Only greetings: the reply
+# is an introduction, so "thanks"/"bye" go to the agent like any other message.
+# These turns are not added to the ADK session history.
+_SMALL_TALK_RE = re.compile(r"^\s*(hi|hello|hey)[\s!.]*$", re.IGNORECASE)
+_SMALL_TALK_REPLY = "Hi, I'm Burpla! Ask me where to eat, how far a place is, or to start a vote."
+
+def _new_message_id() -> str:
+    # Random hex straight from os.urandom; no UUID object is built just to be formatted
+    return "msm_" + os.urandom(16).hex()
+
+# Sent instead of a cut-off card that no longer matches its schema
+_INCOMPLETE_CARD_REPLY = "Sorry, that answer got cut off before it was complete. Please ask again."
+
+def _finalize_json_reply(
+    text: str,
+    session_id: str | None = None,
+    parser: IncrementalJsonParser | None = None,
+) -> str:
+    """Normalizes a JSON-looking reply and stamps a fresh message_id on it.
 
+    Repaired (truncated) output only gets through if it still validates against
+    its card schema, and is then flagged with "truncated": true.
+    """
+    if not looks_like_json(text):
+        return text
+    parsed = parse_json_reply(text, session_id, parser)
+    if parsed is None:
+        # Give back the raw response if no JSON could be recovered
+        return text
+    data = parsed.data
+    if isinstance(data, dict):
+        data["message_id"] = _new_message_id()
+    if parsed.source == SOURCE_REPAIRED:
+        if not is_valid_card(data):
+            logger.warning("json_reply_rejected", extra={"session_id": session_id})
+            return _INCOMPLETE_CARD_REPLY
+        data["truncated"] = True
+    return orjson.dumps(data).decode()
 
-def _looks_like_json(text: str) -> bool:
-    if not isinstance(text, str):
+def _build_app(app_name: str) -> App:
+    # Gemini context caching reuses the static instruction/tool prefix across turns
+    return App(
+        name=app_name,
+        root_agent=root_agent,
+        context_cache_config=ContextCacheConfig(
+            ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+            cache_intervals=CONTEXT_CACHE_INTERVALS,
+        ),
+    )
+
+@lru_cache(maxsize=16)
+def _get_runner(app_name: str) -> Runner:
+    # The runner is a stateless coordinator shared by every session of an app
+    return Runner(app=_build_app(app_name), session_service=_get_session_service())
+
+async def _prepare_runner(app_name: str, user_id: str, session_id: str) -> Runner:
+    """Ensure the ADK session exists and return the shared runner for app_name."""
+    await session_pool.ensure(app_name, user_id, session_id)
+
+    return _get_runner(app_name)
+
+def _reply_cache_key(app_name: str, session_id: str, query: str):
+    digest = hashlib.blake2b(query.strip().lower().encode(), digest_size=16).hexdigest()
+    return (app_name, session_id, digest)
+
+def _is_cacheable_reply(response: str) -> bool:
+    # Cards carry live place data and a per-card message_id; always regenerate them
+    if looks_like_json(response):
         return False
-    t = text.lstrip().lower()
-    return "```json" in t or t.startswith("{") or t.startswith("[")
+    return not response.startswith(("Agent escalated:", _NO_FINAL_RESPONSE))
 
-def _strip_json_fences(text: str) -> str:
-    # Remove single-line or multi-line ```json ... ``` fences safely
-    return re.sub(r"^\s*```json\s*|\s*```\s*$", "", text.strip(), flags=re.IGNORECASE)
+def _session_lock(app_name: str, session_id: str) -> asyncio.Lock:
+    """One lock per live session so overlapping turns can't interleave its history."""
+    return _session_locks.setdefault((app_name, session_id), asyncio.Lock())
 
 async def run_conversation(
     query: str,
     app_name: str = "burpla",
     user_id: str = "something",
     session_id: str = "something",
+    use_cache: bool = True,
 ):
-    session_key = (app_name, session_id)
-    # Always try to ensure session exists, even if we think we created it before
-    # (in case of server restart or service reset)
-    if session_key not in created_sessions:
-        try:
-            await session_service.create_session(
-                app_name=app_name, user_id=user_id, session_id=session_id
-            )
-            created_sessions.add(session_key)
-            logger.info(f"✅ Created session: {session_id} for user: {user_id}")
-        except Exception as e:
-            error_msg = str(e).lower()
-            # If session already exists, that's fine - continue
-            if "already exists" in error_msg or "duplicate" in error_msg:
-                logger.info(f"ℹ️ Session {session_id} already exists, continuing...")
-                created_sessions.add(session_key)
-            else:
-                # For other errors, log but still try to continue
-                # The actual error will surface when we try to use the session
-                logger.warning(f"⚠️ Session creation warning for {session_id}: {e}")
-                created_sessions.add(session_key)
-
-    runner_agent_team = Runner(
-        agent=root_agent, app_name=app_name, session_service=session_service
-    )
+    """Runs one agent turn and returns the reply text (JSON cards as a JSON string).
 
-    # First run
-    response = await call_agent_async(
-        query=query,
-        runner=runner_agent_team,
-        user_id=user_id,
-        session_id=session_id,
-    )
+    Pass use_cache=False for turns the agent must always see, such as vote events
+    and NON-AGENT context messages, even when their text repeats.
+    """
+    # Bare greetings need no model call
+    if _SMALL_TALK_RE.match(query):
+        return _SMALL_TALK_REPLY
+
+    async with _session_lock(app_name, session_id):
+        return await _run_conversation(query, app_name, user_id, session_id, use_cache)
+
+async def _run_conversation(query: str, app_name: str, user_id: str, session_id: str, use_cache: bool):
+    runner_agent_team = await _prepare_runner(app_name, user_id, session_id)
+
+    # First run, unless this session sent the same text seconds ago
+    cache_key = _reply_cache_key(app_name, session_id, query) if use_cache else None
+    response = _reply_cache.get(cache_key) if use_cache else None
+    parser = None
+    if response is None:
+        # Stream the reply so a JSON card is parsed while the model is still generating
+        parser = IncrementalJsonParser()
+        response = await call_agent_async(
+            query=query,
+            runner=runner_agent_team,
+            user_id=user_id,
+            session_id=session_id,
+            run_config=_SSE_RUN_CONFIG,
+            parser=parser,
+        )
+        if use_cache and _is_cacheable_reply(response):
+            _reply_cache[cache_key] = response
+
+    # Plain text is returned as-is; JSON cards get a message_id (no retries)
+    return _finalize_json_reply(response, session_id, parser)
+
+async def run_conversations_batch(items: list[dict]) -> list:
+    """Run independent turns concurrently.
+
+    Each item holds run_conversation keyword arguments (query, user_id, session_id, ...).
+    Results keep the input order; a failed turn yields its exception instead of raising.
+    """
+    async def _one(item):
+        async with _LLM_SEM:
+            return await run_conversation(**item)
 
-    # If it doesn't look like JSON, return as-is (no retries)
-    if not _looks_like_json(response):
-        return response
-
-    # It looks like JSON → try up to 3 attempts to parse valid JSON
-    max_retries = 3
-    last_raw = response
-    for attempt in range(1, max_retries + 1):
-        try:
-            candidate = _strip_json_fences(last_raw)
-            # Try to parse
-            data = json.loads(candidate)
-            # Attach message_id and return as JSON string
-            if isinstance(data, dict):
-                data["message_id"] = f"msm_{uuid.uuid4()}"
-            return json.dumps(data)
-        except Exception as e:
-            print(f"⚠️ JSON parse failed (attempt {attempt}/{max_retries}): {e}")
-            if attempt == max_retries:
-                # Give back the last raw response if parsing never succeeded
-                return last_raw
-            # Re-run the agent only because it looked like JSON but failed to parse
-            await asyncio.sleep(0.75)
-            last_raw = await call_agent_async(
+    return await asyncio.gather(*[_one(item) for item in items], return_exceptions=True)
+
+# Marks the end of a buffered stream (see stream_conversation)
+_STREAM_END = object()
+# Streamed turns keep running after their reader leaves; hold references until done
+_background_turns: "set[asyncio.Task]" = set()
+
+async def _run_streamed_turn(
+    query: str,
+    app_name: str,
+    user_id: str,
+    session_id: str,
+    queue: asyncio.Queue,
+    on_complete: Callable[[str], None] | None,
+    on_error: Callable[[Exception], None] | None,
+) -> None:
+    chunks: list[str] = []
+    error = None
+    try:
+        # Same greeting fast path as run_conversation
+        if _SMALL_TALK_RE.match(query):
+            chunks.append(_SMALL_TALK_REPLY)
+            queue.put_nowait(_SMALL_TALK_REPLY)
+            return
+        async with _session_lock(app_name, session_id):
+            runner_agent_team = await _prepare_runner(app_name, user_id, session_id)
+            async for chunk in stream_agent_async(
                 query=query,
                 runner=runner_agent_team,
                 user_id=user_id,
                 session_id=session_id,
-            )
-    return "Failed to generate valid response. Please try again"
+                run_config=_SSE_RUN_CONFIG,
+                # Only the final turn is the reply (same as call_agent_async)
+                on_turn_end=chunks.clear,
+            ):
+                chunks.append(chunk)
+                # Unbounded queue: the session lock is never held waiting on the reader
+                queue.put_nowait(chunk)
+    except Exception as e:
+        error = e
+    finally:
+        if on_complete is not None and error is None:
+            try:
+                # Same fallback as call_agent_async, so an empty turn still saves a reply
+                on_complete("".join(chunks).strip() or _NO_FINAL_RESPONSE)
+            except Exception:
+                logger.exception("stream_on_complete_failed", extra={"session_id": session_id})
+        if on_error is not None and error is not None:
+            try:
+                on_error(error)
+            except Exception:
+                logger.exception("stream_on_error_failed", extra={"session_id": session_id})
+        queue.put_nowait(error if error is not None else _STREAM_END)
+
+async def stream_conversation(
+    query: str,
+    app_name: str = "burpla",
+    user_id: str = "something",
+    session_id: str = "something",
+    on_complete: Callable[[str], None] | None = None,
+    on_error: Callable[[Exception], None] | None = None,
+) -> AsyncIterator[str]:
+    """Streaming counterpart of run_conversation; yields text chunks as the model produces them.
+
+    The turn runs in its own task and its chunks are buffered, so a slow reader
+    never holds the session lock and a reader that disconnects doesn't cut the
+    turn short. on_complete receives the final turn's full text (or the same
+    fallback run_conversation returns when there is none) when the agent
+    finishes, whether or not anyone is still reading, and before the stream ends.
+    If the turn fails, on_error receives the exception instead, on the same terms.
+    Text from intermediate turns may be yielded but is not part of that reply.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(
+        _run_streamed_turn(query, app_name, user_id, session_id, queue, on_complete, on_error)
+    )
+    _background_turns.add(task)
+    task.add_done_callback(_background_turns.discard)
+
+    while True:
+        item = await queue.get()
+        if item is _STREAM_END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+def finalize_response(text: str) -> str:
+    """Normalize a fully streamed reply the same way run_conversation does, without retries."""
+    return _finalize_json_reply(text)
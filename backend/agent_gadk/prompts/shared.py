@@ -0,0 +1,2 @@
+# Output contract shared by every agent that replies with a JSON card
+JSON_ONLY_OUTPUT = "Output only the JSON: no markdown, code fences, or explanations."
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import weakref
+from typing import Callable
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """Bounded LRU of sessions known to exist in the session service.
+
+    The LRU only saves a lookup; the session service stays the source of truth
+    (server restarts or other instances may not have seen a session yet), and
+    entries expire after ttl seconds so a session deleted elsewhere is re-checked.
+    Concurrent ensure() calls for the same session share one get/create round-trip.
+    The pool belongs to one event loop and is only touched from it, so it needs
+    no thread lock.
+    """
+
+    def __init__(self, get_service: Callable, maxsize: int = 10_000, ttl: float = 3600):
+        self._get_service = get_service
+        self._known: "TTLCache[tuple[str, str], bool]" = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Weak values let locks for sessions nobody is waiting on be collected
+        self._locks: "weakref.WeakValueDictionary[tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def __contains__(self, key) -> bool:
+        return key in self._known
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def _remember(self, key) -> None:
+        self._known[key] = True
+
+    def _is_known(self, key) -> bool:
+        # get() refreshes the entry's LRU position
+        return self._known.get(key, False)
+
+    async def ensure(self, app_name: str, user_id: str, session_id: str) -> None:
+        """Make sure the session exists, creating it on first use."""
+        key = (app_name, session_id)
+        if self._is_known(key):
+            return
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller may have created it while we waited
+            if self._is_known(key):
+                return
+            svc = self._get_service()
+            try:
+                session = await svc.get_session(
+                    app_name=app_name, user_id=user_id, session_id=session_id
+                )
+                if session is None:
+                    await svc.create_session(
+                        app_name=app_name, user_id=user_id, session_id=session_id
+                    )
+                    logger.info("session_created", extra={"session_id": session_id, "user_id": user_id})
+                self._remember(key)
+            except Exception as e:
+                error_msg = str(e).lower()
+                # If session already exists, that's fine - continue
+                if "already exists" in error_msg or "duplicate" in error_msg:
+                    logger.info("session_exists", extra={"session_id": session_id})
+                    self._remember(key)
+                else:
+                    # For other errors, log but still try to continue
+                    # The actual error will surface when we try to use the session
+                    logger.warning("session_create_failed", extra={"session_id": session_id, "error": str(e)})
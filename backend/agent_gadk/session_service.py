@@ -0,0 +1,73 @@
+from typing import Optional
+
+from google.adk.sessions import DatabaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from sqlalchemy import event
+
+from agent_gadk.session_trim import trim_to_recent_turns
+from config import (
+    SESSION_HISTORY_MAX_EVENTS,
+    SESSION_HISTORY_MAX_TURNS,
+    SESSION_DB_POOL_SIZE,
+    SESSION_DB_MAX_OVERFLOW,
+)
+
+
+def _set_sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+class TrimmingSessionService(DatabaseSessionService):
+    """DatabaseSessionService that only loads the most recent turns of a session.
+
+    The runner re-sends every loaded event to Gemini, so capping the history keeps
+    prompt size flat as a conversation ages. The window is cut at user-turn
+    boundaries (see trim_to_recent_turns). Full history stays in the database.
+    """
+
+    def __init__(
+        self,
+        db_url: str,
+        max_turns: int = SESSION_HISTORY_MAX_TURNS,
+        max_events: int = SESSION_HISTORY_MAX_EVENTS,
+        **kwargs,
+    ):
+        # Extra kwargs go to SQLAlchemy's create_engine; size the connection pool
+        # for concurrent agent turns instead of relying on the library default
+        kwargs.setdefault("pool_size", SESSION_DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", SESSION_DB_MAX_OVERFLOW)
+        super().__init__(db_url=db_url, **kwargs)
+        self.max_turns = max_turns
+        self.max_events = max_events
+
+        if self.db_engine.dialect.name == "sqlite":
+            # WAL lets session reads proceed while a turn appends events; NORMAL
+            # sync is safe under WAL and skips an fsync per commit
+            event.listen(self.db_engine, "connect", _set_sqlite_wal)
+            # Drop connections opened during table setup so every pooled one gets the pragmas
+            self.db_engine.dispose()
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        if config is not None:
+            return await super().get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, config=config
+            )
+        session = await super().get_session(
+            app_name=app_name,
+            user_id=user_id,
+            session_id=session_id,
+            config=GetSessionConfig(num_recent_events=self.max_events),
+        )
+        if session is not None:
+            session.events = trim_to_recent_turns(session.events, self.max_turns)
+        return session
@@ -0,0 +1,42 @@
+"""Turn-aware trimming of the ADK session events sent with each agent turn.
+
+Kept free of ADK imports so it can be tested on its own.
+"""
+from agent_gadk.json_reply import looks_like_json
+
+
+def _event_text(event) -> str:
+    content = getattr(event, "content", None)
+    parts = content.parts if content is not None and content.parts else ()
+    return "".join(part.text for part in parts if getattr(part, "text", None))
+
+
+def is_recommendation_card(event) -> bool:
+    text = _event_text(event)
+    return looks_like_json(text) and '"recommendation_card"' in text
+
+
+def trim_to_recent_turns(events: list, max_turns: int) -> list:
+    """Keeps the events of the last max_turns user turns, oldest first.
+
+    A turn starts at a user-authored event, so tool calls and agent transfers
+    never count against the limit and the cut never splits a turn. When the
+    newest recommendation card falls before the cut, its query and the card are
+    kept ahead of the window: vote flows read restaurant ids from it.
+    """
+    start, turns = 0, 0
+    for i in range(len(events) - 1, -1, -1):
+        if events[i].author == "user":
+            start = i
+            turns += 1
+            if turns == max_turns:
+                break
+    kept = events[start:]
+    if any(is_recommendation_card(e) for e in kept):
+        return kept
+    for card in range(start - 1, -1, -1):
+        if is_recommendation_card(events[card]):
+            query = next((i for i in range(card - 1, -1, -1) if events[i].author == "user"), None)
+            head = [events[query], events[card]] if query is not None else [events[card]]
+            return head + kept
+    return kept
@@ -1,15 +1,22 @@
-import warnings
-warnings.filterwarnings('ignore')
-from dotenv import load_dotenv
+import agent_gadk._setup  # noqa: F401
+import json
 from google.adk.agents import Agent
-from config import GEMINI_FLASH, GEMINI_PRO
+from config import GENERATION_MODEL
+from agent_gadk.models import gemini
 from agent_gadk.tools import google_places_text_search
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
-from base_models.agent_models import RecommendationResult
+from base_models.agent_models import RecommendationResult, RECOMMENDATION_RESULT_EXAMPLE
+from agent_gadk.prompts.shared import JSON_ONLY_OUTPUT
 from google.genai import types
 
-load_dotenv(override=True)
+# Built once at import; the instruction below is then a plain constant. The example
+# is the schema's own example dict (no schema generation), dumped compactly to keep
+# the instruction short.
+_RECOMMENDATION_EXAMPLE_JSON = json.dumps(
+    RECOMMENDATION_RESULT_EXAMPLE,
+    separators=(",", ":"),
+    ensure_ascii=False,
+)
+
 gen_cfg = types.GenerateContentConfig(
     temperature=0.1,
 )
@@ -17,15 +24,16 @@ gen_cfg = types.GenerateContentConfig(
 
 pipeline_recommendation_agent = Agent(
     name="pipeline_recommendation_agent",
-    model=GEMINI_FLASH,
+    model=gemini(GENERATION_MODEL),
     description="Searches for restaurants and returns structured recommendation cards.",
     instruction=f"""
         Return the result in the following JSON format:
 
-        {RecommendationResult.model_json_schema()["example"]}
+        {_RECOMMENDATION_EXAMPLE_JSON}
 
         Always set "type" to "recommendation_card".
         Restaurant id must be provided for each option.
+        {JSON_ONLY_OUTPUT}
     """,
     tools=[google_places_text_search],
     output_schema=RecommendationResult,
@@ -1,67 +1,61 @@
-import warnings
-warnings.filterwarnings('ignore')
-
-from dotenv import load_dotenv
+import agent_gadk._setup  # noqa: F401
+import json
 from google.adk.agents import Agent
-from config import GEMINI_FLASH, GEMINI_PRO
-from agent_gadk.tools import generate_vote
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
-from base_models.agent_models import VoteResponse
+from google.adk.planners import BuiltInPlanner
+from config import GEMINI_PRO, ROUTING_MODEL
+from agent_gadk.models import gemini
+from agent_gadk.tools import generate_vote, google_places_get_id, google_places_get_ids
+from base_models.agent_models import VoteResponse, VOTE_RESPONSE_EXAMPLE
+from agent_gadk.prompts.shared import JSON_ONLY_OUTPUT
 from google.genai import types
-from agent_gadk.tools import google_places_get_id
 
-load_dotenv(override=True)
+# Built once at import; the instruction below is then a plain constant. The example
+# is the schema's own example dict (no schema generation), dumped compactly.
+_VOTE_EXAMPLE_JSON = json.dumps(
+    VOTE_RESPONSE_EXAMPLE,
+    separators=(",", ":"),
+    ensure_ascii=False,
+)
 
 gen_cfg = types.GenerateContentConfig(
     temperature=0,
+    max_output_tokens=4096,
+)
+# The Pro agents only copy IDs or tool output, so cap their thinking (128 is the
+# Pro minimum); thinking tokens count towards max_output_tokens. ADK takes the
+# thinking config through a planner rather than generate_content_config.
+_low_thinking = BuiltInPlanner(thinking_config=types.ThinkingConfig(thinking_budget=128))
+_ids_cfg = types.GenerateContentConfig(
+    temperature=0,
+    max_output_tokens=1024,
 )
-# pipeline_vote_agent = Agent(
-#     name="pipeline_vote_agent",
-#     model=GEMINI_FLASH,
-#     description="Creates structured voting polls from restaurant IDs found in prior conversation.",
-#     instruction=f"""
-#         Extract all restaurant_id values from previous messages (typically from recommendation cards).
-#         Then call:
-#             generate_vote(place_ids=[list_of_ids])
-
-#         Return the result strictly following this JSON format:
-#         {VoteResponse.model_json_schema()['example']}
-
-#         Notes:
-#         - Always set "type" to "vote_card".
-#         - Ensure "vote_options" is a list of valid restaurant options with their IDs, names, and vote counts.
-#         - number_of_vote: 0 (Always initialize to zero)
-#         - vote_user_id_list": [], (Always initialize to empty list)
-#     """,
-#     tools=[generate_vote],
-#     output_schema=VoteResponse,
-# )
 
 extract_id_agent = Agent(
     name="extract_id_agent",
-    model=GEMINI_PRO,
+    model=gemini(GEMINI_PRO),
     description="Extracts restaurant/place IDs or retrieves them by name if missing.",
-    generate_content_config=gen_cfg,
-    tools=[google_places_get_id],
-    instruction="""
+    generate_content_config=_ids_cfg,
+    planner=_low_thinking,
+    tools=[google_places_get_ids, google_places_get_id],
+    instruction=f"""
         Extract all restaurant/place IDs (restaurant_id, place_id) from previous messages.
-        If IDs are missing but restaurant names appear, call `google_places_get_id` to retrieve them.
+        If IDs are missing but restaurant names appear, call `google_places_get_ids` once with all
+        of those names to retrieve them concurrently (`google_places_get_id` handles a single name).
 
         Return a JSON list of unique place_id strings, e.g.:
         ["ChIJ123abc456", "ChIJ789def012"]
 
         Rules:
         - No duplicates or guesses.
-        - No text, markdown, or explanations.
         - Return [] if nothing found.
+        - {JSON_ONLY_OUTPUT}
     """,
 )
 
 
 validate_vote_agent = Agent(
     name="validate_vote_agent",
-    model=GEMINI_PRO,
+    model=gemini(GEMINI_PRO),
     description="Calls generate_vote and ensures JSON validity. Retries until valid JSON is produced.",
     instruction=f"""
         You are responsible for generating a valid voting card JSON.
@@ -71,28 +65,29 @@ validate_vote_agent = Agent(
         1. Call generate_vote with provided IDs.
         2. Check if the output is valid JSON executable according to VoteResponse.
         3. If invalid, retry up to 3 times until it parses correctly.
-        4. Return only the final JSON (no extra text, no code fences).
+        4. Return the final JSON. {JSON_ONLY_OUTPUT}
 
         The JSON must match this schema example:
-        {VoteResponse.model_json_schema()['example']}
+        {_VOTE_EXAMPLE_JSON}
     """,
     tools=[generate_vote],
     generate_content_config=gen_cfg,
+    planner=_low_thinking,
     output_schema=VoteResponse,
 )
 
 pipeline_vote_agent = Agent(
     name="pipeline_vote_agent",
-    model=GEMINI_FLASH,
+    model=gemini(ROUTING_MODEL),
     description="Coordinates a two-step vote creation process: extract restaurant IDs then generate a valid vote card JSON.",
-    instruction="""
+    instruction=f"""
         You are the coordinator of the voting pipeline.
 
         Step 1: Delegate to 'extract_id_agent' to retrieve restaurant IDs from prior conversation.
         Step 2: Send those IDs to 'validate_vote_agent' to generate the final vote card.
         Step 3: Ensure the returned JSON conforms exactly to the VoteResponse schema.
 
-        Output strictly as JSON (no markdown or code fences).
+        {JSON_ONLY_OUTPUT}
     """,
     sub_agents=[extract_id_agent, validate_vote_agent],
     generate_content_config=gen_cfg,
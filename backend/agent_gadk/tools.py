@@ -1,38 +1,206 @@
-import os, requests, uuid, warnings
-warnings.filterwarnings('ignore')
-
-import googlemaps
-from dotenv import load_dotenv
-from typing import List
-
-load_dotenv(override=True)
-def distance_matrix(origin: str, destination: str, mode: str = 'driving') -> None:
+import agent_gadk._setup  # noqa: F401
+import asyncio, logging, threading, uuid
+
+import httpx
+import orjson
+from cachetools import TTLCache
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional
+from config import GOOGLE_API_KEY
+
+if TYPE_CHECKING:
+    import googlemaps
+
+logger = logging.getLogger(__name__)
+
+_PLACES_BATCH_CONCURRENCY = 8
+# Distance Matrix per-request limits
+_DISTANCE_MAX_PER_SIDE = 25
+_DISTANCE_MAX_ELEMENTS = 100
+
+# Outbound HTTP: fail fast on a hung upstream and retry transient statuses with backoff
+_HTTP_CONNECT_TIMEOUT = 2.0
+_HTTP_READ_TIMEOUT = 8.0
+_HTTP_MAX_RETRIES = 3
+_HTTP_BACKOFF_FACTOR = 0.3
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_GOOGLE_API_KEY = GOOGLE_API_KEY
+
+# Static request data, built once per process
+_TEXT_SEARCH_URL = "https://places.googleapis.com/v1/places:searchText"
+_DETAILS_URL_TEMPLATE = "https://places.googleapis.com/v1/places/{}"
+_PHOTO_URL_TEMPLATE = "https://places.googleapis.com/v1/{}/media?key=%s&maxHeightPx=400&maxWidthPx=400" % _GOOGLE_API_KEY
+
+# httpx.Headers are normalised once here; per-request merging then copies them as-is
+# Only the fields the recommendation card renders; photos.name is enough to build the media URL
+_PLACES_TEXT_HEADERS = httpx.Headers({
+    "Content-Type": "application/json",
+    "X-Goog-FieldMask": "places.id,places.displayName,places.formattedAddress,places.priceLevel,places.rating,places.userRatingCount,places.photos.name,places.googleMapsUri",
+})
+# reviews/location are never shown on a vote card and reviews dominate the payload size
+_PLACES_DETAILS_HEADERS = httpx.Headers({
+    "Content-Type": "application/json",
+    "X-Goog-FieldMask": "id,displayName,formattedAddress,rating,userRatingCount,photos.name,googleMapsUri",
+})
+_PLACES_ID_HEADERS = httpx.Headers({
+    "Content-Type": "application/json",
+    "X-Goog-FieldMask": "places.id,places.displayName",
+})
+
+# Shared async HTTP/2 client: Places calls reuse pooled connections and never
+# block the event loop the agent runs on
+_ASYNC_CLIENT = httpx.AsyncClient(
+    timeout=httpx.Timeout(_HTTP_READ_TIMEOUT, connect=_HTTP_CONNECT_TIMEOUT),
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        retries=2,
+    ),
+    headers={"X-Goog-Api-Key": _GOOGLE_API_KEY or ""},
+)
+
+# Identical Places calls share one request: concurrent callers await the same
+# in-flight task (see _coalesced) and later callers hit the result cache.
+# Text searches within a minute
+_PLACES_SEARCH_CACHE = TTLCache(maxsize=512, ttl=60)
+_PLACES_SEARCH_INFLIGHT: Dict[str, asyncio.Task] = {}
+# Name -> place id lookups change far less often than search results
+_PLACES_ID_CACHE = TTLCache(maxsize=2048, ttl=3600)
+_PLACES_ID_INFLIGHT: Dict[str, asyncio.Task] = {}
+# Built vote options by place id; a restaurant's details rarely change within an hour
+_PLACE_DETAILS_CACHE = TTLCache(maxsize=4096, ttl=3600)
+_PLACE_DETAILS_INFLIGHT: Dict[str, asyncio.Task] = {}
+
+async def _coalesced(cache: TTLCache, inflight: Dict[str, asyncio.Task], key: str, fetch: Callable[[], Awaitable[dict]]) -> dict:
+    """Returns the cached result for key, or joins/starts the one in-flight fetch for it.
+
+    Results carrying an "error" key and raised exceptions are passed to the
+    waiting callers but never cached.
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        inflight[key] = task
+
+        def _done(t):
+            inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None and "error" not in t.result():
+                cache[key] = t.result()
+
+        task.add_done_callback(_done)
+
+    # shield: one caller being cancelled must not cancel the fetch for the others
+    return await asyncio.shield(task)
+
+def _photo_url(photos: Optional[list]) -> str:
+    """Media URL for the first photo's resource name, or "" when there is none."""
+    name = photos[0].get("name") if photos else None
+    return _PHOTO_URL_TEMPLATE.format(name) if name else ""
+
+async def _request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Sends a request on the shared client, retrying 429/5xx with exponential backoff."""
+    for attempt in range(_HTTP_MAX_RETRIES):
+        response = await _ASYNC_CLIENT.request(method, url, **kwargs)
+        if response.status_code not in _RETRY_STATUSES or attempt == _HTTP_MAX_RETRIES - 1:
+            return response
+        await asyncio.sleep(_HTTP_BACKOFF_FACTOR * (2 ** attempt))
+
+_GMAPS_CLIENT: Optional["googlemaps.Client"] = None
+_GMAPS_LOCK = threading.Lock()
+
+def _get_gmaps() -> "googlemaps.Client":
+    """Return the process-wide googlemaps client, creating it on first use.
+
+    googlemaps (and requests under it) is imported here rather than at module
+    load, since only distance_matrix needs it.
+    """
+    global _GMAPS_CLIENT
+    if _GMAPS_CLIENT is None:
+        with _GMAPS_LOCK:
+            if _GMAPS_CLIENT is None:
+                import googlemaps
+                from requests.adapters import HTTPAdapter
+
+                client = googlemaps.Client(
+                    key=_GOOGLE_API_KEY,
+                    connect_timeout=_HTTP_CONNECT_TIMEOUT,
+                    read_timeout=_HTTP_READ_TIMEOUT,
+                    # googlemaps retries 5xx/over-limit itself until this budget runs out
+                    retry_timeout=10,
+                )
+                # Concurrent tool calls share one keep-alive pool instead of requests' default of 10
+                client.session.mount(
+                    "https://", HTTPAdapter(pool_connections=20, pool_maxsize=50)
+                )
+                _GMAPS_CLIENT = client
+    return _GMAPS_CLIENT
+
+def _chunks(seq: list, n: int):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+async def distance_matrix(origins: List[str], destinations: List[str], mode: str = 'driving') -> dict:
     """
-        Retrieves the distance matrix between an origin and a destination using Google Maps API.
+        Retrieves the distance matrix between origins and destinations using Google Maps API.
+        Pass every origin and destination you need in one call instead of calling once per pair.
 
         Args:
-        origin (str): The starting location (e.g., "Houston, TX").
-        destination (str): The ending location (e.g., "Austin, TX").
+        origins (List[str]): The starting locations (e.g., ["Houston, TX"]).
+        destinations (List[str]): The ending locations (e.g., ["Austin, TX", "Dallas, TX"]).
         mode (str): The mode of transportation (e.g., "driving", "walking", "bicycling", "transit").
 
         Returns:
-        dict: A dictionary containing the distance matrix information.
+        dict: A dictionary containing the distance matrix information, one row per origin
+        with one element per destination.
 
     """
+    # googlemaps is blocking (requests); run it off the event loop so other turns keep going
+    return await asyncio.to_thread(_distance_matrix, origins, destinations, mode)
+
+def _distance_matrix(origins: List[str], destinations: List[str], mode: str) -> dict:
+    """Blocking Distance Matrix calls backing distance_matrix."""
+    if isinstance(origins, str):
+        origins = [origins]
+    if isinstance(destinations, str):
+        destinations = [destinations]
+
+    # One request covers up to 25 origins, 25 destinations and 100 elements;
+    # larger inputs are split into blocks and stitched back into one matrix
+    dest_step = min(_DISTANCE_MAX_PER_SIDE, len(destinations)) or 1
+    origin_step = max(1, min(_DISTANCE_MAX_PER_SIDE, _DISTANCE_MAX_ELEMENTS // dest_step))
+    result = {
+        "origin_addresses": list(origins),
+        "destination_addresses": list(destinations),
+        "rows": [{"elements": [None] * len(destinations)} for _ in origins],
+        "status": "OK",
+    }
     try:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        gmaps = googlemaps.Client(key=api_key)
-        result = gmaps.distance_matrix(
-            origins=[origin],
-            destinations=[destination],
-            mode="driving",
-            units="imperial"
-        )
+        gmaps = _get_gmaps()
+        for oi, origin_block in enumerate(_chunks(origins, origin_step)):
+            for di, dest_block in enumerate(_chunks(destinations, dest_step)):
+                block = gmaps.distance_matrix(
+                    origins=origin_block,
+                    destinations=dest_block,
+                    mode=mode,
+                    units="imperial"
+                )
+                o0, d0 = oi * origin_step, di * dest_step
+                for k, address in enumerate(block.get("origin_addresses", [])):
+                    result["origin_addresses"][o0 + k] = address
+                for k, address in enumerate(block.get("destination_addresses", [])):
+                    result["destination_addresses"][d0 + k] = address
+                for k, row in enumerate(block.get("rows", [])):
+                    result["rows"][o0 + k]["elements"][d0:d0 + len(dest_block)] = row.get("elements", [])
     except Exception as e:
+        logger.debug("Distance Matrix request failed: %s", e)
         return {"error": f"Distance Matrix API Request failed: {e}"}
     return result
 
-def google_places_text_search(text_query: str) -> dict:
+async def google_places_text_search(text_query: str) -> dict:
     """
         Searches for places using Google Places API (New) based on a text query.
         Args:
@@ -40,56 +208,96 @@ def google_places_text_search(text_query: str) -> dict:
         Returns:
             dict: A dictionary containing the search results from the Places API.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    api_url = "https://places.googleapis.com/v1/places:searchText"
-    
-    # Corrected/Expanded Field Mask (standard best practice)
-    field_mask = "places.id,places.displayName,places.formattedAddress,places.priceLevel,places.rating,places.userRatingCount,places.types,places.photos,places.googleMapsUri"
-
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": api_key,
-        "X-Goog-FieldMask": field_mask
+    return await _coalesced(
+        _PLACES_SEARCH_CACHE, _PLACES_SEARCH_INFLIGHT, text_query.strip().lower(),
+        lambda: _places_text_search(text_query),
+    )
+
+
+def _build_search_option(place: dict) -> dict:
+    """Maps one text search result to a recommendation option."""
+    pget = place.get
+    return {
+        'restaurant_id': pget('id', 'N/A'),
+        'restaurant_name': pget('displayName', {}).get('text', 'Unknown'),
+        'description': pget('formattedAddress', 'Address not available'),
+        'image': _photo_url(pget("photos")),
+        'rating': str(pget('rating', 'N/A')),
+        'userRatingCount': pget('userRatingCount', 0),
+        'formattedAddress': pget('formattedAddress', 'N/A'),
+        'priceLevel': str(pget('priceLevel', 'N/A')),
+        'map': pget('googleMapsUri', 'N/A')
     }
+
+async def _places_text_search(text_query: str) -> dict:
+    """Uncached Places text search backing google_places_text_search."""
     payload = {"textQuery": text_query}
 
     try:
-        response = requests.post(api_url, headers=headers, json=payload)
+        response = await _request("POST", _TEXT_SEARCH_URL, headers=_PLACES_TEXT_HEADERS, content=orjson.dumps(payload))
         response.raise_for_status()
-        
-        result = {"type": "recommendation", "options": []}
-
-        # Check for the 'places' key in the response JSON
-        places = response.json().get('places', [])
-        # Check if places_cache variable exitss
-
-        for place in places:
-            photo_uri = None
-            if place.get("photos"):
-                # photos[0].name contains the photo resource name
-                photo_name = place["photos"][0].get("name")
-                if photo_name:
-                    # Construct the correct Photo Media URL
-                    photo_uri = f"https://places.googleapis.com/v1/{photo_name}/media?key={api_key}&maxHeightPx=400&maxWidthPx=400"
-
-            option = {
-                'restaurant_id': place.get('id', 'N/A'),
-                'restaurant_name': place.get('displayName', {}).get('text', 'Unknown'),
-                'description': place.get('formattedAddress', 'Address not available'),
-                'image': photo_uri or "",
-                'rating': str(place.get('rating', 'N/A')),
-                'userRatingCount': place.get('userRatingCount', 0),
-                'formattedAddress': place.get('formattedAddress', 'N/A'),
-                'priceLevel': str(place.get('priceLevel', 'N/A')),
-                'map': place.get('googleMapsUri', 'N/A')
-            }
-            result['options'].append(option)
+
+        places = orjson.loads(response.content).get('places', [])
+        result = {"type": "recommendation", "options": [_build_search_option(p) for p in places]}
 
         return result
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
+        logger.debug("Places text search failed for %r: %s", text_query, e)
         return {"error": f"Places API Request failed: {e}", "type": "recommendation"}
 
-def generate_vote(place_ids: List[str]) -> dict:
+
+async def google_places_text_search_batch(text_queries: List[str]) -> dict:
+    """
+        Runs several Google Places text searches concurrently.
+        Args:
+            text_queries (List[str]): Text queries to search for (e.g., ["pho in Houston", "ramen in Austin"]).
+        Returns:
+            dict: {"results": [...]} with one google_places_text_search result per query, in order.
+    """
+    sem = asyncio.Semaphore(_PLACES_BATCH_CONCURRENCY)
+
+    async def _one(text_query):
+        async with sem:
+            return await google_places_text_search(text_query)
+
+    results = await asyncio.gather(*[_one(q) for q in text_queries])
+    return {"results": results}
+
+def _build_vote_option(place: dict, place_id: str) -> dict:
+    """Maps one Place Details response to a vote option."""
+    pget = place.get
+    return {
+        'restaurant_id': place_id,
+        'restaurant_name': (pget("displayName") or {}).get("text"),
+        'description': pget("formattedAddress"),
+        'image': _photo_url(pget("photos")),
+        'rating': pget('rating', 'N/A'),
+        'userRatingCount': pget('userRatingCount', 0),
+        'number_of_vote': 0,
+        'map': pget("googleMapsUri")
+    }
+
+def _place_error(place_id: str, error: Exception) -> dict:
+    return {
+        "error": f"Failed to fetch details for {place_id}: {error}",
+        "placeId": place_id
+    }
+
+async def _fetch_place_details(place_id: str) -> dict:
+    response = await _request("GET", _DETAILS_URL_TEMPLATE.format(place_id), headers=_PLACES_DETAILS_HEADERS)
+    response.raise_for_status()
+    return _build_vote_option(orjson.loads(response.content), place_id)
+
+async def _fetch_place(place_id: str) -> dict:
+    """Fetches one place's details and maps it to a vote option."""
+    option = await _coalesced(
+        _PLACE_DETAILS_CACHE, _PLACE_DETAILS_INFLIGHT, place_id,
+        lambda: _fetch_place_details(place_id),
+    )
+    # Copy so a caller editing the card can't change the cached entry
+    return dict(option)
+
+async def generate_vote(place_ids: List[str]) -> dict:
     """
         Generates voting options based on a list of place IDs using Google Places API.
         Args:
@@ -97,51 +305,23 @@ def generate_vote(place_ids: List[str]) -> dict:
         Returns:
             dict: A dictionary containing the voting options.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    field_mask = "id,displayName,formattedAddress,location,rating,userRatingCount,photos,googleMapsUri,reviews"
-
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": api_key,
-        "X-Goog-FieldMask": field_mask
+    # Places API (New) has no batch-get-by-id endpoint and searchText cannot filter
+    # by id, so one Place Details call per id is the minimum; run them concurrently
+    # (gather keeps input order). One bad id must not fail the whole card, so any
+    # exception is mapped to the same error entry as an HTTP failure.
+    # The extractor can repeat an id mentioned in several messages; fetch each once
+    unique_ids = list(dict.fromkeys(place_ids))
+    if len(unique_ids) < len(place_ids):
+        logger.debug("generate_vote: %d duplicate place ids skipped", len(place_ids) - len(unique_ids))
+    results = await asyncio.gather(*[_fetch_place(pid) for pid in unique_ids], return_exceptions=True)
+    details_by_id = {
+        pid: _place_error(pid, r) if isinstance(r, Exception) else r
+        for pid, r in zip(unique_ids, results)
     }
+    vote_options = [details_by_id[pid] for pid in place_ids]
 
-    vote_options = []
-
-    for place_id in place_ids:
-        details_url = f"https://places.googleapis.com/v1/places/{place_id}"
-
-        try:
-            response = requests.get(details_url, headers=headers)
-            response.raise_for_status()
-            place = response.json()
-
-            photo_uri = None
-            if place.get("photos"):
-                photo_name = place["photos"][0].get("name")
-                if photo_name:
-                    photo_uri = f"https://places.googleapis.com/v1/{photo_name}/media?key={api_key}&maxHeightPx=400&maxWidthPx=400"
-
-            vote_option = {
-                'restaurant_id': place_id,
-                'restaurant_name': place.get("displayName", {}).get("text"),
-                'description': place.get("formattedAddress"),
-                'image': photo_uri or "",
-                'rating': place.get('rating', 'N/A'),
-                'userRatingCount': place.get('userRatingCount', 0),
-                'number_of_vote': 0,
-                'map': place.get("googleMapsUri")
-            }
-            vote_options.append(vote_option)
-
-        except requests.exceptions.RequestException as e:
-            vote_options.append({
-                "error": f"Failed to fetch details for {place_id}: {e}",
-                "placeId": place_id
-            })
-    
     res = {
-        'message_id': f"msg-{str(uuid.uuid4())}",
+        'message_id': "msg-" + uuid.uuid4().hex,
         "sender_name": "Burpla",
         "type": "vote_card",
         'vote_options': vote_options
@@ -150,7 +330,7 @@ def generate_vote(place_ids: List[str]) -> dict:
     return res
 
 
-def google_places_get_id(restaurant_name: str) -> dict:
+async def google_places_get_id(restaurant_name: str) -> dict:
     """
     Retrieves the Google Place ID for a given restaurant name using the Places API.
 
@@ -161,20 +341,40 @@ def google_places_get_id(restaurant_name: str) -> dict:
         dict: A dictionary containing either the place ID or an error message.
               Example: {"restaurant_name": "Hoàng Gia Quán", "restaurant_id": "ChIJSQLB2undQIYR65aaBQDpozQ"}
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    api_url = "https://places.googleapis.com/v1/places:searchText"
+    return await _coalesced(
+        _PLACES_ID_CACHE, _PLACES_ID_INFLIGHT, restaurant_name.strip().lower(),
+        lambda: _places_get_id(restaurant_name),
+    )
 
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": api_key,
-        "X-Goog-FieldMask": "places.id,places.displayName"
-    }
+
+async def google_places_get_ids(restaurant_names: List[str]) -> dict:
+    """
+    Retrieves Google Place IDs for several restaurant names concurrently.
+
+    Args:
+        restaurant_names (List[str]): The restaurant names to look up (e.g., ["Pho Dien", "Sapa"]).
+
+    Returns:
+        dict: {"results": [...]} with one google_places_get_id result per name, in order.
+    """
+    sem = asyncio.Semaphore(_PLACES_BATCH_CONCURRENCY)
+
+    async def _one(name):
+        async with sem:
+            return await google_places_get_id(name)
+
+    results = await asyncio.gather(*[_one(n) for n in restaurant_names])
+    return {"results": results}
+
+
+async def _places_get_id(restaurant_name: str) -> dict:
+    """Uncached place id lookup backing google_places_get_id."""
     payload = {"textQuery": restaurant_name}
 
     try:
-        response = requests.post(api_url, headers=headers, json=payload)
+        response = await _request("POST", _TEXT_SEARCH_URL, headers=_PLACES_ID_HEADERS, content=orjson.dumps(payload))
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         places = data.get("places", [])
 
         if not places:
@@ -192,5 +392,6 @@ def google_places_get_id(restaurant_name: str) -> dict:
             "restaurant_id": place_id
         }
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
+        logger.debug("Places ID lookup failed for %r: %s", restaurant_name, e)
         return {"error": f"Places API Request failed: {e}"}
@@ -1,7 +1,55 @@
-from pydantic import BaseModel, Field
-from fastapi import Body
-from typing import Optional, List, Dict, Any, Literal
-import uuid
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Literal
+
+# Schema examples, built once; the sub-agents also embed them in their instructions
+VOTE_OPTION_EXAMPLE = {
+    "restaurant_id": "ChIJ123",
+    "restaurant_name": "Sushi Zen",
+    "description": "Authentic Japanese sushi bar with omakase options.",
+    "image": "https://example.com/sushi.jpg",
+    "rating": "4.8",
+    "userRatingCount": 321,
+    "number_of_vote": 12,
+    "map": "https://maps.google.com/?q=Sushi+Zen",
+}
+
+VOTE_RESPONSE_EXAMPLE = {
+    "message_id": "msg_001",
+    "sender_name": "pipeline_vote_agent",
+    "type": "vote_card",
+    "vote_options": [
+        VOTE_OPTION_EXAMPLE,
+        {
+            "restaurant_id": "ChIJ456",
+            "restaurant_name": "Luigi’s Trattoria",
+            "description": "Italian trattoria famous for homemade pasta.",
+            "image": "https://example.com/luigi.jpg",
+            "rating": "4.6",
+            "userRatingCount": 210,
+            "number_of_vote": 0,
+            "vote_user_id_list": [],
+            "map": "https://maps.google.com/?q=Luigi’s+Trattoria",
+        },
+    ],
+}
+
+RECOMMENDATION_OPTION_EXAMPLE = {
+    "restaurant_id": "12345",
+    "restaurant_name": "Luigi’s Trattoria",
+    "description": "Cozy Italian spot famous for its pasta and wine list.",
+    "image": "https://example.com/image.jpg",
+    "rating": "4.6",
+    "userRatingCount": 240,
+    "formattedAddress": "123 Main St, Houston, TX",
+    "priceLevel": "$$",
+    "map": "https://maps.google.com/?q=Luigi’s+Trattoria",
+}
+
+RECOMMENDATION_RESULT_EXAMPLE = {
+    "type": "recommendation_card",
+    "options": [RECOMMENDATION_OPTION_EXAMPLE],
+}
+
 
 
 class VoteOption(BaseModel):
@@ -22,19 +70,7 @@ class VoteOption(BaseModel):
     )
     map: Optional[str] = Field(None, description="Google Maps URL for location.")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "restaurant_id": "ChIJ123",
-                "restaurant_name": "Sushi Zen",
-                "description": "Authentic Japanese sushi bar with omakase options.",
-                "image": "https://example.com/sushi.jpg",
-                "rating": "4.8",
-                "userRatingCount": 321,
-                "number_of_vote": 12,
-                "map": "https://maps.google.com/?q=Sushi+Zen",
-            }
-        }
+    model_config = ConfigDict(json_schema_extra={"example": VOTE_OPTION_EXAMPLE})
 
 
 class VoteResponse(BaseModel):
@@ -49,28 +85,7 @@ class VoteResponse(BaseModel):
         ..., description="List of restaurant options for voting."
     )
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "message_id": "msg_001",
-                "sender_name": "pipeline_vote_agent",
-                "type": "vote_card",
-                "vote_options": [
-                    VoteOption.Config.json_schema_extra["example"],
-                    {
-                        "restaurant_id": "ChIJ456",
-                        "restaurant_name": "Luigi’s Trattoria",
-                        "description": "Italian trattoria famous for homemade pasta.",
-                        "image": "https://example.com/luigi.jpg",
-                        "rating": "4.6",
-                        "userRatingCount": 210,
-                        "number_of_vote": 0,
-                        "vote_user_id_list": [],
-                        "map": "https://maps.google.com/?q=Luigi’s+Trattoria",
-                    },
-                ],
-            }
-        }
+    model_config = ConfigDict(json_schema_extra={"example": VOTE_RESPONSE_EXAMPLE})
 
 
 class RecommendationOptions(BaseModel):
@@ -92,20 +107,7 @@ class RecommendationOptions(BaseModel):
     )
     map: str = Field(..., description="Google Maps URL")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "restaurant_id": "12345",
-                "restaurant_name": "Luigi’s Trattoria",
-                "description": "Cozy Italian spot famous for its pasta and wine list.",
-                "image": "https://example.com/image.jpg",
-                "rating": "4.6",
-                "userRatingCount": 240,
-                "formattedAddress": "123 Main St, Houston, TX",
-                "priceLevel": "$$",
-                "map": "https://maps.google.com/?q=Luigi’s+Trattoria",
-            }
-        }
+    model_config = ConfigDict(json_schema_extra={"example": RECOMMENDATION_OPTION_EXAMPLE})
 
 class RecommendationResult(BaseModel):
     """Top-level response schema for the agent output."""
@@ -117,10 +119,4 @@ class RecommendationResult(BaseModel):
         ..., description="List of restaurant recommendation cards"
     )
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "type": "recommendation_card",
-                "options": [RecommendationOptions.Config.json_schema_extra["example"]],
-            }
-        }
+    model_config = ConfigDict(json_schema_extra={"example": RECOMMENDATION_RESULT_EXAMPLE})
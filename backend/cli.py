@@ -1,13 +1,14 @@
-import asyncio
 import uuid
-from agent_gadk.orchestrator import run_conversation
-from db_services.chat import ChatManager
+from datetime import datetime
+import uvloop
+from agent_gadk.orchestrator import stream_conversation, finalize_response
+from db_services.managers import chat_manager
+from config import configure_logging
 
 async def main():
     user_id = "user_001"
     session_id = str(uuid.uuid4())
     session_id = "session_001"
-    chat_manager = ChatManager()
     print("🍔 Welcome to the Burpla CLI! Type your messages below (type 'exit' or 'quit' to leave):\n")
     while True:
         user_input = input("You: ").strip()
@@ -15,30 +16,45 @@ async def main():
         if not user_input:
             continue
 
-        chat_manager.save_chat_message(
-            session_id=session_id,
-            user_id=user_id,
-            message_id=str(uuid.uuid4()),
-            content=user_input
-        )
+        # Saved together with the reply once the turn ends
+        user_message = {
+            "session_id": session_id,
+            "user_id": user_id,
+            "message_id": str(uuid.uuid4()),
+            "content": user_input,
+            "timestamp": datetime.now().isoformat(),
+        }
+
+        def save_reply(text):
+            chat_manager.save_chat_messages([
+                user_message,
+                {
+                    "session_id": session_id,
+                    "user_id": 'bot',
+                    "message_id": str(uuid.uuid4()),
+                    "content": finalize_response(text.strip()),
+                },
+            ])
 
-        response = await run_conversation(
+        def save_query_only(error):
+            chat_manager.save_chat_messages([user_message])
+
+        # Print the reply as the model generates it instead of after the last token
+        print("\n🍔 Burpla: ", end="", flush=True)
+        async for chunk in stream_conversation(
             query=user_input,
             app_name="burpla",
             user_id=user_id,
-            session_id=session_id
-        )
-
-        chat_manager.save_chat_message(
             session_id=session_id,
-            user_id='bot',
-            message_id=str(uuid.uuid4()),
-            content=response
-        )
+            on_complete=save_reply,
+            on_error=save_query_only,
+        ):
+            print(chunk, end="", flush=True)
+        print("\n")
 
-        print(f"\n🍔 Burpla: {response}\n")
         if user_input.lower() in {"exit", "quit"}:
             break
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    configure_logging()
+    uvloop.run(main())
@@ -1,13 +1,57 @@
 import os
 from dotenv import load_dotenv
 
+# The only load_dotenv call; other modules import config to pick up .env
 load_dotenv(override=True)
 
+# Logging: JSON records on stderr, quiet by default in production
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+
+def configure_logging():
+    """Installs the JSON log handler at LOG_LEVEL; called once by each entry point (main, cli)."""
+    import logging
+    from pythonjsonlogger.json import JsonFormatter
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logging.basicConfig(level=LOG_LEVEL, handlers=[handler])
+
+# Read once here instead of per tool call
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
 # Model Configuration
 # Using gemini-2.5-pro which supports function calling with google-genai SDK
 GEMINI_FLASH = "gemini-2.0-flash"
 GEMINI_PRO = "gemini-2.5-pro"
 
+# Per-task models: pure delegators only route, so a lighter model is enough
+ROOT_MODEL = os.getenv("ROOT_MODEL", GEMINI_PRO)
+ROUTING_MODEL = os.getenv("ROUTING_MODEL", "gemini-2.0-flash-lite")
+GENERATION_MODEL = os.getenv("GENERATION_MODEL", GEMINI_FLASH)
+
 # Session Configuration
 DATABASE_PATH = "database/burpla.db"
 DEFAULT_APP_NAME = "burpla"
+# ADK session store (conversation events). Any SQLAlchemy URL works; point every
+# worker/instance at one shared database (e.g. Cloud SQL) so a session's history
+# is found wherever its next turn lands.
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "sqlite:///./my_agent_data.db")
+# Newest chat messages returned when a session is opened
+CHAT_HISTORY_MAX_MESSAGES = 200
+# ADK history sent per agent turn, counted in user turns (a turn's tool calls and
+# replies don't count against it); the newest recommendation card is always kept
+SESSION_HISTORY_MAX_TURNS = 10
+# Upper bound on the events read from the session store to build that window
+SESSION_HISTORY_MAX_EVENTS = 200
+# SQLAlchemy pool behind the ADK session service; the default 5 connections
+# serialise session reads/writes once more turns than that run concurrently
+SESSION_DB_POOL_SIZE = int(os.getenv("SESSION_DB_POOL_SIZE", max(4, os.cpu_count() or 1)))
+SESSION_DB_MAX_OVERFLOW = int(os.getenv("SESSION_DB_MAX_OVERFLOW", 10))
+
+# Gemini context cache for the static agent prefix (instruction + tools)
+CONTEXT_CACHE_TTL_SECONDS = 3600
+CONTEXT_CACHE_INTERVALS = 10
+
+# Identical text replies are reused only this long: enough to absorb a double
+# submit or client retry, short enough that a real repeat question reaches the agent
+REPLY_CACHE_TTL_SECONDS = 10
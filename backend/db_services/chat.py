@@ -1,24 +1,42 @@
 import sqlite3
-from config import DATABASE_PATH
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-import uuid, json
+import uuid, json, ast, logging
+import orjson
 from db_services.user import UserManager
 
+logger = logging.getLogger(__name__)
+
 class ChatManager:
     """Manages chat history persistence using a simple SQLite database."""
 
-    def __init__(self, db_path="burbla.db"):
+    def __init__(self, db_path="burbla.db", user_manager=None):
         self.db_path = db_path
         self.table_name = "chat_sessions"
-        self.user_manager = UserManager(db_path)
+        self.user_manager = user_manager or UserManager(db_path)
+        # One connection for the manager's lifetime instead of a connect per call.
+        # Every message of a turn is written through it, so WAL (readers don't block
+        # the writer) and NORMAL sync (no fsync per commit, still safe under WAL)
+        # are set once here along with foreign keys.
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        # The connection is shared across threads (CLI, threadpool routes); one
+        # transaction at a time
+        self._lock = threading.RLock()
         self._initialize_db()
 
+    @contextmanager
+    def _transaction(self):
+        """Holds the connection lock; commits on exit, or rolls back on error."""
+        with self._lock, self._conn:
+            yield self._conn
+
     def _initialize_db(self):
         """Creates the necessary table if it doesn't exist."""
-        with sqlite3.connect(self.db_path) as conn:
-            # Enable foreign key constraints
-            conn.execute("PRAGMA foreign_keys = ON")
-
+        with self._transaction() as conn:
             cursor = conn.cursor()
 
             # Check if table exists
@@ -44,6 +62,12 @@ class ChatManager:
                 # Table exists - migrate invalid user_ids if needed
                 self._migrate_invalid_user_ids(cursor)
 
+            # Every lookup filters on session_id; the index's implicit rowid
+            # suffix also keeps history reads in insertion order without a sort
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{self.table_name}_session_id
+                ON {self.table_name}(session_id)
+            """)
             conn.commit()
 
             # Check if table is empty and add 1 convo if it is
@@ -53,11 +77,13 @@ class ChatManager:
             if count == 0:
                 with open('db_services/sample.json', 'r') as file:
                     sample = json.load(file)
-                for msg in sample:
-                    cursor.execute(f"""
-                        INSERT INTO {self.table_name} (session_id, user_id, message_id, content, timestamp)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (default_session, msg['user_id'], msg['message_id'], msg['content'], msg['timestamp']))
+                cursor.executemany(f"""
+                    INSERT INTO {self.table_name} (session_id, user_id, message_id, content, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [
+                    (default_session, msg['user_id'], msg['message_id'], msg['content'], msg['timestamp'])
+                    for msg in sample
+                ])
 
     def _migrate_invalid_user_ids(self, cursor):
         """Migrate invalid user_ids in chat_sessions to valid ones from users table.
@@ -79,8 +105,6 @@ class ChatManager:
         invalid_user_ids = [uid for uid in chat_user_ids if uid not in valid_user_ids]
 
         if invalid_user_ids:
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(f"Found {len(invalid_user_ids)} invalid user_ids in chat_sessions: {invalid_user_ids}")
             logger.warning("These are likely old frontend-generated IDs. New messages will use authenticated user_ids.")
             # Note: We don't automatically migrate these as we can't determine which user they belong to
@@ -89,7 +113,7 @@ class ChatManager:
 
     def get_invalid_user_ids(self):
         """Get a list of invalid user_ids in chat_sessions that don't exist in users table."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._transaction() as conn:
             cursor = conn.cursor()
             # Get all distinct user_ids from chat_sessions
             cursor.execute("""
@@ -114,7 +138,7 @@ class ChatManager:
         if not new_user_info:
             raise ValueError(f"New user_id {new_user_id} does not exist in users table")
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE chat_sessions
@@ -136,16 +160,12 @@ class ChatManager:
             user_info = self.user_manager.get_user(user_id)
             if not user_info:
                 # User doesn't exist - this is an error
-                import logging
-                logger = logging.getLogger(__name__)
                 error_msg = f"User {user_id} not found in users table. Cannot save message. Please ensure user is authenticated first."
                 logger.error(error_msg)
                 raise ValueError(error_msg)
 
         current_time = datetime.now().isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            # Enable foreign keys
-            conn.execute("PRAGMA foreign_keys = ON")
+        with self._transaction() as conn:
             cursor = conn.cursor()
 
             try:
@@ -156,23 +176,74 @@ class ChatManager:
                 conn.commit()
             except sqlite3.IntegrityError as e:
                 # Foreign key constraint violation (if foreign keys were enforced)
-                import logging
-                logger = logging.getLogger(__name__)
                 error_msg = f"Foreign key constraint violation: {e}. User {user_id} not found in users table."
                 logger.error(error_msg)
                 raise ValueError(error_msg) from e
 
-    def load_chat_history(self, session_id):
-        """Loads the chat history for a given session ID. Returns empty list if session doesn't exist."""
-        with sqlite3.connect(self.db_path) as conn:
-            # Enable foreign keys
-            conn.execute("PRAGMA foreign_keys = ON")
+    def save_chat_messages(self, messages):
+        """Saves several chat messages in one transaction.
+        messages: iterable of dicts with session_id, user_id, message_id, content and
+        optionally timestamp (defaults to now), written in the given order.
+        Same user_id validation as save_chat_message; nothing is written if any user_id is invalid.
+        """
+        messages = list(messages)
+        for user_id in {m["user_id"] for m in messages} - {'bot', 'burpla', 'ai'}:
+            if not self.user_manager.get_user(user_id):
+                error_msg = f"User {user_id} not found in users table. Cannot save message. Please ensure user is authenticated first."
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+
+        current_time = datetime.now().isoformat()
+        with self._transaction() as conn:
             cursor = conn.cursor()
-            # Check if the session exists
-            cursor.execute("""
-                SELECT * FROM chat_sessions WHERE session_id = ?
-            """, (session_id,))
+            cursor.executemany("""
+                INSERT INTO chat_sessions (session_id, user_id, content, message_id, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (m["session_id"], m["user_id"], m["content"], m["message_id"], m.get("timestamp") or current_time)
+                for m in messages
+            ])
+            conn.commit()
+
+    def load_chat_history(self, session_id, limit=None, after_message_id=None, recent=None):
+        """Loads the chat history for a given session ID. Returns empty list if session doesn't exist.
+        Optional paging: limit caps the number of messages returned, after_message_id
+        returns only messages stored after that message (in insertion order).
+        Raises ValueError if after_message_id is not a message of this session, so a
+        stale anchor is not mistaken for "no new messages".
+        recent keeps only the newest N messages, still returned oldest first (limit is then ignored).
+        """
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            query = """
+                SELECT session_id, user_id, message_id, content, timestamp
+                FROM chat_sessions WHERE session_id = ?
+            """
+            params = [session_id]
+            if after_message_id is not None:
+                cursor.execute("""
+                    SELECT rowid FROM chat_sessions
+                    WHERE session_id = ? AND message_id = ?
+                """, (session_id, after_message_id))
+                anchor = cursor.fetchone()
+                if not anchor:
+                    raise ValueError("Message ID not found in the specified session.")
+                query += " AND rowid > ?"
+                params.append(anchor[0])
+            if recent is not None:
+                # Newest first so LIMIT keeps the tail; flipped back below
+                query += " ORDER BY rowid DESC LIMIT ?"
+                params.append(recent)
+            else:
+                query += " ORDER BY rowid"
+                if limit is not None:
+                    query += " LIMIT ?"
+                    params.append(limit)
+
+            cursor.execute(query, params)
             rows = cursor.fetchall()
+            if recent is not None:
+                rows.reverse()
 
             # If no session is found, return empty list (don't create a new session)
             if not rows:
@@ -193,39 +264,23 @@ class ChatManager:
     def initialize_chat_session(self, session_id):
         """Initializes a new chat session with a bot welcome message.
         Only call this when explicitly creating a new session."""
-        with sqlite3.connect(self.db_path) as conn:
-            # Enable foreign keys
-            conn.execute("PRAGMA foreign_keys = ON")
+        bot_message_id = uuid.uuid4().hex  # Generate a unique message ID
+        bot_content = "I am Burbla, how can I help you today?"
+        current_time = datetime.now().isoformat()
+        with self._transaction() as conn:
             cursor = conn.cursor()
 
-            # Check if the session already exists
-            cursor.execute("""
-                SELECT * FROM chat_sessions WHERE session_id = ?
-            """, (session_id,))
-            rows = cursor.fetchall()
-
-            # If session already exists, return existing messages
-            if rows:
-                return [
-                    {
-                        "session_id": row[0],
-                        "user_id": row[1],
-                        "message_id": row[2],
-                        "content": row[3],
-                        "timestamp": row[4]
-                    }
-                    for row in rows
-                ]
-
-            # Create a new session with a bot message
-            bot_message_id = str(uuid.uuid4())  # Generate a unique message ID
-            bot_content = "I am Burbla, how can I help you today?"
-            current_time = datetime.now().isoformat()
+            # Insert the welcome message only if the session has no messages yet,
+            # so the common path is a single statement instead of SELECT then INSERT
             cursor.execute("""
                 INSERT INTO chat_sessions (session_id, user_id, message_id, content, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            """, (session_id, "bot", bot_message_id, bot_content, current_time))
+                SELECT ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM chat_sessions WHERE session_id = ?)
+            """, (session_id, "bot", bot_message_id, bot_content, current_time, session_id))
             conn.commit()
+            created = cursor.rowcount == 1
+
+        if created:
             return [{
                 "session_id": session_id,
                 "user_id": "bot",
@@ -234,9 +289,12 @@ class ChatManager:
                 "timestamp": current_time
             }]
 
+        # If session already exists, return existing messages
+        return self.load_chat_history(session_id)
+
     def delete_chat_session(self, session_id):
         """Deletes a chat session from the database."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 DELETE FROM chat_sessions
@@ -279,7 +337,7 @@ class ChatManager:
             }
         """
         # Find message by message_id
-        with sqlite3.connect(self.db_path) as conn:
+        with self._transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT content FROM chat_sessions
@@ -290,22 +348,18 @@ class ChatManager:
                 raise ValueError("Message ID not found in the specified session.")
 
             content = row[0]
-            print(f"[VOTE] Content from DB: {content}")
-            print(f"[VOTE] Content type: {type(content)}")
+            logger.debug("[VOTE] Content from DB (%s): %s", type(content).__name__, content)
 
             # Try to parse as JSON
             try:
-                vote_card = json.loads(content)
-            except json.JSONDecodeError as e:
+                vote_card = orjson.loads(content)
+            except orjson.JSONDecodeError as e:
                 # If JSON parsing fails, try to handle Python dict string representation
-                import logging
-                logger = logging.getLogger(__name__)
                 logger.error(f"Failed to parse content as JSON: {e}")
                 logger.error(f"Content that failed to parse: {repr(content)}")
 
                 # Try using ast.literal_eval as fallback (for Python dict strings)
                 try:
-                    import ast
                     vote_card = ast.literal_eval(content)
                     logger.info("Successfully parsed content using ast.literal_eval")
                 except (ValueError, SyntaxError) as ast_error:
@@ -357,7 +411,7 @@ class ChatManager:
 
             if updated:
                 # Update the message content in the database
-                new_content = json.dumps(vote_card)
+                new_content = orjson.dumps(vote_card).decode()
                 timestamp = datetime.now().isoformat()
                 cursor.execute("""
                     UPDATE chat_sessions
@@ -0,0 +1,8 @@
+from db_services.user import UserManager
+from db_services.chat import ChatManager
+from db_services.session import SessionManager
+
+# One instance of each manager per process, so table setup and migrations run once
+user_manager = UserManager()
+chat_manager = ChatManager(user_manager=user_manager)
+session_manager = SessionManager()
@@ -1,15 +1,29 @@
 import sqlite3
-from config import DATABASE_PATH
 from datetime import datetime
+from cachetools import TTLCache
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SessionManager:
     """Manage ."""
 
-    def __init__(self, db_path="burbla.db"):
+    def __init__(self, db_path="burbla.db", enable_cache=True):
         self.db_path = db_path
         self.table_name = "convo"
+        # Short-lived cache for get(): one request often reads the same session several times
+        self._session_cache = TTLCache(maxsize=1024, ttl=2) if enable_cache else None
         self._initialize_db()
 
+    def _invalidate(self, session_id=None):
+        """Drops cached get() results for session_id, or all of them when None."""
+        if self._session_cache is None:
+            return
+        if session_id is None:
+            self._session_cache.clear()
+        else:
+            self._session_cache.pop(session_id, None)
+
     def _initialize_db(self):
         """Creates the necessary table if it doesn't exist."""
         with sqlite3.connect(self.db_path) as conn:
@@ -25,6 +39,13 @@ class SessionManager:
                 )
             """)
 
+            # Serves get_all's ORDER BY without a sort step
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{self.table_name}_last_updated
+                ON {self.table_name}(last_updated DESC, session_id DESC)
+            """)
+            self._log_query_plan(cursor)
+
             # Check if table is empty and add 1 convo if it is
             cursor.execute(f"SELECT COUNT(*) FROM {self.table_name}")
             count = cursor.fetchone()[0]
@@ -52,6 +73,18 @@ class SessionManager:
 
                 conn.commit()
 
+    def _log_query_plan(self, cursor):
+        """Logs (at debug level) which index the get_all query uses."""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        cursor.execute(f"""
+            EXPLAIN QUERY PLAN
+            SELECT session_id FROM {self.table_name}
+            WHERE member_id_list LIKE ?
+            ORDER BY last_updated DESC, session_id DESC
+        """, ("%",))
+        logger.debug(f"get_all query plan: {[row[3] for row in cursor.fetchall()]}")
+
     def add_session(self, session_id, session_name, owner_id, member_id_list):
         """Adds a new session to the database, including timestamps."""
         with sqlite3.connect(self.db_path) as conn:
@@ -63,23 +96,21 @@ class SessionManager:
                 VALUES (?, ?, ?, ?, ?, ?)
             """, (session_id, session_name, owner_id, member_id_list, now, now))
             conn.commit()
+        self._invalidate(session_id)
 
     def _run_migration_if_needed(self):
         """Run migration to fix corrupted member_id_list entries if needed."""
         try:
             fixed_count = self.fix_corrupted_member_lists()
             if fixed_count > 0:
-                import logging
-                logger = logging.getLogger(__name__)
                 logger.info(f"Fixed {fixed_count} corrupted member_id_list entries on startup")
         except Exception as e:
             # Don't fail initialization if migration fails
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(f"Migration check failed (non-critical): {e}")
 
     def update_member_list(self, session_id, member_id_list):
         """Updates the member_id_list for an existing session."""
+        self._invalidate(session_id)
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(f"""
@@ -123,29 +154,29 @@ class SessionManager:
         """Updates the session_name and/or member_id_list for an existing session.
         member_id_list should be a comma-separated string (e.g., "user_001,user_002").
         """
+        self._invalidate(session_id)
+        # Ensure member_id_list is a string, not a list
+        if isinstance(member_id_list, list):
+            member_id_list = ','.join(member_id_list)
+        if not session_name and not member_id_list:
+            return
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            if session_name:
-                cursor.execute(f"""
-                    UPDATE {self.table_name}
-                    SET session_name = ?, last_updated = ?
-                    WHERE session_id = ?
-                """, (session_name, datetime.now().isoformat(), session_id))
-            if member_id_list:
-                # Ensure member_id_list is a string, not a list
-                if isinstance(member_id_list, list):
-                    member_id_list = ','.join(member_id_list)
-                cursor.execute(f"""
-                    UPDATE {self.table_name}
-                    SET member_id_list = ?, last_updated = ?
-                    WHERE session_id = ?
-                """, (member_id_list, datetime.now().isoformat(), session_id))
+            # One UPDATE for both fields; COALESCE keeps whichever one wasn't passed
+            cursor.execute(f"""
+                UPDATE {self.table_name}
+                SET session_name = COALESCE(?, session_name),
+                    member_id_list = COALESCE(?, member_id_list),
+                    last_updated = ?
+                WHERE session_id = ?
+            """, (session_name or None, member_id_list or None, datetime.now().isoformat(), session_id))
             conn.commit()
 
     def fix_corrupted_member_lists(self):
         """Fix corrupted member_id_list entries where characters are separated by commas.
         This happens when a string was joined character-by-character instead of as a list.
         """
+        self._invalidate()
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             # Get all sessions
@@ -182,13 +213,15 @@ class SessionManager:
                             WHERE session_id = ?
                         """, (fixed_member_list, datetime.now().isoformat(), session_id))
                         fixed_count += 1
-                        print(f"Fixed session {session_id}: '{member_id_list}' -> '{fixed_member_list}'")
+                        logger.info("Fixed session %s: '%s' -> '%s'", session_id, member_id_list, fixed_member_list)
 
             conn.commit()
             return fixed_count
 
     def get(self, session_id):
         """Retrieves a conversation from the database by session_id."""
+        if self._session_cache is not None and session_id in self._session_cache:
+            return dict(self._session_cache[session_id])
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(f"""
@@ -198,7 +231,7 @@ class SessionManager:
             """, (session_id,))
             row = cursor.fetchone()
             if row:
-                return {
+                convo = {
                     "session_id": row[0],
                     "session_name": row[1],
                     "owner_id": row[2],
@@ -206,10 +239,14 @@ class SessionManager:
                     "last_updated": row[4],
                     "created_date": row[5]
                 }
+                if self._session_cache is not None:
+                    self._session_cache[session_id] = convo
+                return dict(convo)
             return None
 
     def delete(self, session_id):
         """Deletes a  from the database by session_id."""
+        self._invalidate(session_id)
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(f"""
@@ -219,6 +256,7 @@ class SessionManager:
 
     def update_last_updated(self, session_id):
         """Updates the last_updated timestamp of a conversation."""
+        self._invalidate(session_id)
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(f"""
@@ -230,57 +268,63 @@ class SessionManager:
 
     def join_session(self, session_id, user_id):
         """Adds a user to a session's member_id_list if they're not already in it."""
+        self._invalidate(session_id)
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            # Get current session
-            cursor.execute(f"""
-                SELECT member_id_list FROM {self.table_name}
-                WHERE session_id = ?
-            """, (session_id,))
-            row = cursor.fetchone()
-
-            if not row:
-                return False  # Session doesn't exist
-
-            current_member_list = row[0] or ""
-            # Parse current members
-            current_members = [m.strip() for m in current_member_list.split(",") if m.strip()]
-
-            # Check if user is already in the list
-            if user_id in current_members:
-                return True  # User already in session
-
-            # Add user to the list
-            current_members.append(user_id)
-            new_member_list = ','.join(current_members)
-
-            # Update the session
+            # Append in a single conditional UPDATE instead of read-modify-write;
+            # instr() rather than LIKE since '_' in user ids is a LIKE wildcard.
+            # Spaces are stripped in both the membership check and the rewritten
+            # list, as the old split/strip/join did
             cursor.execute(f"""
                 UPDATE {self.table_name}
-                SET member_id_list = ?, last_updated = ?
+                SET member_id_list = CASE
+                        WHEN REPLACE(IFNULL(member_id_list, ''), ' ', '') = '' THEN ?
+                        ELSE REPLACE(member_id_list, ' ', '') || ',' || ?
+                    END,
+                    last_updated = ?
                 WHERE session_id = ?
-            """, (new_member_list, datetime.now().isoformat(), session_id))
+                  AND instr(',' || REPLACE(IFNULL(member_id_list, ''), ' ', '') || ',', ',' || ? || ',') = 0
+            """, (user_id, user_id, datetime.now().isoformat(), session_id, user_id))
             conn.commit()
-            return True
+            if cursor.rowcount:
+                return True
+
+            # Nothing updated: either the user is already a member or the session doesn't exist
+            cursor.execute(f"SELECT 1 FROM {self.table_name} WHERE session_id = ?", (session_id,))
+            return cursor.fetchone() is not None
     
-    def get_all(self, user_id):
-        """Lists all convos where the user belongs to member_id_list, ordered by last_updated DESC."""
+    def iter_all(self, user_id, limit=None, start_after=None):
+        """Yields convos where the user belongs to member_id_list, ordered by last_updated DESC.
+        Rows are read straight off the cursor, so only one convo is held in memory at a time.
+        Optional keyset paging: limit caps the page size and start_after is the
+        (last_updated, session_id) of the last convo on the previous page.
+        """
+        query = f"""
+            SELECT session_id, session_name, owner_id, member_id_list, last_updated, created_date
+            FROM {self.table_name}
+            WHERE member_id_list LIKE ?
+        """
+        params = [f"%{user_id}%"]
+        if start_after is not None:
+            query += " AND (last_updated, session_id) < (?, ?)"
+            params += list(start_after)
+        query += " ORDER BY last_updated DESC, session_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute(f"""
-                SELECT * FROM {self.table_name}
-                WHERE member_id_list LIKE ?
-                ORDER BY last_updated DESC
-            """, (f"%{user_id}%",))
-            rows = cursor.fetchall()
-            convos = []
-            for row in rows:
-                convos.append({
+            for row in cursor.execute(query, params):
+                yield {
                     "session_id": row[0],
                     "session_name": row[1],
                     "owner_id": row[2],
                     "member_id_list": row[3],
                     "last_updated": row[4],
                     "created_date": row[5]
-                })
-            return convos
+                }
+
+    def get_all(self, user_id, limit=None, start_after=None):
+        """Lists all convos where the user belongs to member_id_list (see iter_all)."""
+        return list(self.iter_all(user_id, limit=limit, start_after=start_after))
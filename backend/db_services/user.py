@@ -1,7 +1,7 @@
 import sqlite3
-from config import DATABASE_PATH
-from datetime import datetime
-import uuid
+import uuid, logging
+
+logger = logging.getLogger(__name__)
 
 class UserManager:
     """Manages Users."""
@@ -159,8 +159,6 @@ class UserManager:
 
                 return True, user_id
         except Exception as e:
-            import traceback
-            print(f"Error in authentication method: {e}")
-            print(traceback.format_exc())
+            logger.exception("Error in authentication method: %s", e)
             # Return False on error so the endpoint can handle it
             return False, None
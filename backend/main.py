@@ -1,27 +1,25 @@
+import logging
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import os
-from dotenv import load_dotenv
-from db_services.chat import ChatManager
-from db_services.user import UserManager
-from db_services.session import SessionManager
+from db_services.managers import user_manager
 from base_models.db_models import AuthenticationRequest
 from routers import chat, user, session
+from config import configure_logging
 
-load_dotenv(override=True)
-
-# Initialize database managers
-user_manager = UserManager()
-chat_manager = ChatManager()
-convo_manager = SessionManager()
+# Structured logs keep the request path off blocking print() calls
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="FastAPI Template",
     description="A template for FastAPI applications",
     version="1.0.0",
+    # Route return values (session lists, chat history) are encoded with orjson
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS middleware - must be added before routers
@@ -44,7 +42,7 @@ app.add_middleware(
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """Handle HTTP exceptions"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
     )
@@ -52,7 +50,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={"detail": exc.errors()}
     )
@@ -84,25 +82,30 @@ async def health_check():
 async def authentication(request: AuthenticationRequest):
     """Authenticate user by gmail. Creates new user if they don't exist."""
     try:
-        print(f"[AUTH] Received request: gmail={request.gmail}, name={request.name}")
+        logger.debug("[AUTH] Received request: gmail=%s, name=%s", request.gmail, request.name)
         is_authenticated, user_id = user_manager.authentication(request.gmail, request.name)
-        print(f"[AUTH] Result: is_authenticated={is_authenticated}, user_id={user_id}")
         if not is_authenticated:
-            print(f"[AUTH] Authentication failed for {request.gmail}")
+            logger.warning("[AUTH] Authentication failed for %s", request.gmail)
             return {"is_authenticated": False, "detail": "Authentication failed"}
-        print(f"[AUTH] Authentication successful for {request.gmail}, user_id={user_id}")
+        logger.info("[AUTH] Authentication successful for %s, user_id=%s", request.gmail, user_id)
         return {
             "is_authenticated": True,
             "detail": "Authentication successful",
             "user_id": user_id
         }
     except Exception as e:
-        import traceback
-        print(f"[AUTH] Authentication error: {e}")
-        print(traceback.format_exc())
+        logger.exception("[AUTH] Authentication error: %s", e)
         return {"is_authenticated": False, "detail": f"Authentication error: {str(e)}"}
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", "8000"))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Import string form so uvicorn can spawn workers (same settings as the Dockerfile)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        loop="uvloop",
+        http="httptools",
+    )
@@ -1,13 +1,11 @@
 from fastapi import APIRouter
-from fastapi import FastAPI, HTTPException, Query, Body
-from google.genai import types
-import os, json, uuid
-from dotenv import load_dotenv
-from agent_gadk.orchestrator import run_conversation
-from db_services.chat import ChatManager
-from db_services.user import UserManager
-from db_services.session import SessionManager
-from fastapi.responses import Response
+from fastapi import HTTPException, Query
+import json, uuid, traceback
+import orjson
+from datetime import datetime
+from agent_gadk.orchestrator import run_conversation, stream_conversation, finalize_response
+from db_services.managers import user_manager, chat_manager, session_manager
+from fastapi.responses import Response, StreamingResponse
 from tools.google_map import plot_named_locations_googlemap
 from base_models.db_models import UserMessage, AgentMessage, CreateMarkersRequest
 
@@ -15,10 +13,6 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-user_manager = UserManager()
-chat_manager = ChatManager()
-session_manager = SessionManager()
-
 router = APIRouter(
     prefix="/chat",
     tags=["chat"],
@@ -43,6 +37,16 @@ def get_all_chat_history_agent_ready(self, session_id):
     
     return agent_ready_history
 
+def _pending_message(session_id, user_id, message_id, content):
+    """A message held back to be saved with the bot's reply, stamped with when it was sent."""
+    return {
+        "session_id": session_id,
+        "user_id": user_id,
+        "message_id": message_id,
+        "content": content,
+        "timestamp": datetime.now().isoformat(),
+    }
+
 @router.post("/vote")
 async def vote_card(
     session_id: str = Query(..., example="session_003"),
@@ -71,37 +75,34 @@ async def vote_card(
             # Create vote message
             vote_message = f"I voted for {restaurant_name}" if is_vote_up else f"I removed my vote for {restaurant_name}"
 
-            # Save the vote as a chat message
-            vote_message_id = f"msg_{str(uuid.uuid4())}"
-            chat_manager.save_chat_message(
-                session_id=session_id,
-                user_id=user_id,
-                message_id=vote_message_id,
-                content=vote_message,
-            )
+            # Saved together with the bot's response below
+            vote_chat_message = _pending_message(session_id, user_id, "msg_" + uuid.uuid4().hex, vote_message)
 
             # Send the vote message to the bot agent for processing
             try:
                 logger.info(f"📝 Vote message: {vote_message}")
+                # A re-vote repeats the same text; the agent must still see it
                 bot_response = await run_conversation(
-                    vote_message, app_name="burpla", user_id=user_id, session_id=session_id
+                    vote_message, app_name="burpla", user_id=user_id, session_id=session_id, use_cache=False
                 )
 
                 logger.info(f"✅ Bot response to vote: {bot_response}")
 
-                # Save the bot's response
-                response_message_id = f"msm_{str(uuid.uuid4())}"
-                chat_manager.save_chat_message(
-                    session_id=session_id,
-                    user_id="bot",
-                    message_id=response_message_id,
-                    content=bot_response,
-                )
+                # Save the vote message and the bot's response in one transaction
+                chat_manager.save_chat_messages([
+                    vote_chat_message,
+                    {
+                        "session_id": session_id,
+                        "user_id": "bot",
+                        "message_id": "msm_" + uuid.uuid4().hex,
+                        "content": bot_response,
+                    },
+                ])
             except Exception as bot_error:
                 # Log the error but don't fail the vote - the vote was already recorded
                 logger.error(f"Error sending vote message to bot: {bot_error}")
-                import traceback
                 logger.error(traceback.format_exc())
+                chat_manager.save_chat_messages([vote_chat_message])
 
             logger.info(f"User {user_name} ({user_id}) voted for {restaurant_name} in session {session_id}")
 
@@ -115,7 +116,6 @@ async def vote_card(
         raise HTTPException(status_code=400, detail=f"Invalid JSON format in message content: {str(e)}")
     except Exception as e:
         logger.error(f"Unexpected error recording vote: {e}")
-        import traceback
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -123,12 +123,34 @@ async def vote_card(
 @router.post("/create_markers")
 async def create_markers(request: CreateMarkersRequest):
     """Create map markers for restaurants in the conversation session."""
-    html = plot_named_locations_googlemap(
+    html = await plot_named_locations_googlemap(
         request.users_location, request.places_location
     )
     return Response(content=html, media_type="text/html")
 
 
+async def _send_non_agent_query(query, user_info, user_id, session_id):
+    """Gives the agent a message that wasn't addressed to it, as context only"""
+    query_wrapper = f"""
+            Note: THIS IS A NON-AGENT QUERY, DO NOT RESPOND TO THE USER.
+
+            Information about the user for more context: Name: {user_info[1]}, Preferences: {user_info[3]}, Location: {user_info[4]}
+            Only use it if the user query requires more context about the user.
+
+            Query: {query}
+            DON'T RESPOND TO THE USER.
+        """
+    logger.info(f"📝 Query: {query_wrapper}")
+    await run_conversation(
+        query_wrapper,
+        app_name="burpla",
+        user_id=user_id,
+        session_id=session_id,
+        use_cache=False,
+    )
+    return Response(status_code=204)  # No content response
+
+
 @router.post("/sent", response_model=AgentMessage)
 async def send_user_message(message: UserMessage):
     """Send message to agent and wait for response"""
@@ -137,7 +159,7 @@ async def send_user_message(message: UserMessage):
     owner_id = session_manager.get_owner_id(message.session_id) or 'anonymous'
     user_info = user_manager.get_user(user_id)
     session_id = message.session_id
-    input_message_id = f"msg_{str(uuid.uuid4())}"
+    input_message_id = "msg_" + uuid.uuid4().hex
 
     if not user_info:
         # User not found - this shouldn't happen if authentication worked correctly
@@ -148,14 +170,10 @@ async def send_user_message(message: UserMessage):
             status_code=404,
             detail=error_msg
         )
-    chat_manager.save_chat_message(
-        session_id=session_id,
-        user_id=user_id,
-        message_id=input_message_id,
-        content=query,
-    )
 
     if message.is_to_agent:
+        # Saved together with the reply below
+        user_message = _pending_message(session_id, user_id, input_message_id, query)
 
         # Wrapper for user info
         query_wrapper = f"""
@@ -166,22 +184,30 @@ async def send_user_message(message: UserMessage):
 
         # logger.info(query_wrapper)
         logger.info(f"📝 Query: {query_wrapper}")
-        response = await run_conversation(
-            query,
-            app_name="burpla",
-            user_id=user_id,
-            session_id=session_id,
-        )
+        try:
+            response = await run_conversation(
+                query,
+                app_name="burpla",
+                user_id=user_id,
+                session_id=session_id,
+            )
+        except Exception:
+            # The user's message is kept even when the turn fails
+            chat_manager.save_chat_messages([user_message])
+            raise
 
         logger.info(f"✅ Response: {response}")
 
-        response_message_id = f"msm_{str(uuid.uuid4())}"
-        chat_manager.save_chat_message(
-            session_id=session_id,
-            user_id="bot",
-            message_id=response_message_id,
-            content=response,
-        )
+        response_message_id = "msm_" + uuid.uuid4().hex
+        chat_manager.save_chat_messages([
+            user_message,
+            {
+                "session_id": session_id,
+                "user_id": "bot",
+                "message_id": response_message_id,
+                "content": response,
+            },
+        ])
         return AgentMessage(
             user_id="bot",
             name="Burpla",
@@ -189,21 +215,77 @@ async def send_user_message(message: UserMessage):
             message_id=response_message_id,
         )
     else: 
-        query_wrapper = f"""
-            Note: THIS IS A NON-AGENT QUERY, DO NOT RESPOND TO THE USER.
+        chat_manager.save_chat_message(
+            session_id=session_id,
+            user_id=user_id,
+            message_id=input_message_id,
+            content=query,
+        )
+        return await _send_non_agent_query(query, user_info, user_id, session_id)
 
-            Information about the user for more context: Name: {user_info[1]}, Preferences: {user_info[3]}, Location: {user_info[4]}
-            Only use it if the user query requires more context about the user.
 
-            Query: {query}
-            DON'T RESPOND TO THE USER.
-        """
-        # logger.info(query_wrapper)
-        logger.info(f"📝 Query: {query_wrapper}")
-        response = await run_conversation(
-            query_wrapper,
+@router.post("/sent_stream")
+async def send_user_message_stream(message: UserMessage):
+    """Send message to agent and stream the response as NDJSON.
+
+    Each line is {"type": "delta", "text": ...} while the model generates, then one
+    {"type": "final", "message_id": ..., "message": ...} carrying the reply exactly
+    as saved (JSON cards normalized); clients should replace the streamed text
+    with it. Non-agent messages behave as on /sent (204, nothing streamed).
+    """
+    query = message.message
+    user_id = str(message.user_id)
+    user_info = user_manager.get_user(user_id)
+    session_id = message.session_id
+
+    if not user_info:
+        error_msg = f"User {user_id} not found in users table. Please authenticate first."
+        logger.error(error_msg)
+        raise HTTPException(status_code=404, detail=error_msg)
+
+    input_message_id = "msg_" + uuid.uuid4().hex
+    if not message.is_to_agent:
+        chat_manager.save_chat_message(
+            session_id=session_id,
+            user_id=user_id,
+            message_id=input_message_id,
+            content=query,
+        )
+        return await _send_non_agent_query(query, user_info, user_id, session_id)
+
+    # Saved together with the reply once the turn ends
+    user_message = _pending_message(session_id, user_id, input_message_id, query)
+    saved = {}
+
+    def save_reply(text):
+        # Runs when the agent finishes, even if the client has disconnected
+        response = finalize_response(text.strip())
+        message_id = "msm_" + uuid.uuid4().hex
+        chat_manager.save_chat_messages([
+            user_message,
+            {
+                "session_id": session_id,
+                "user_id": "bot",
+                "message_id": message_id,
+                "content": response,
+            },
+        ])
+        saved.update(message_id=message_id, message=response)
+
+    def save_query_only(error):
+        # The user's message is kept even when the turn fails
+        chat_manager.save_chat_messages([user_message])
+
+    async def body():
+        async for chunk in stream_conversation(
+            query,
             app_name="burpla",
             user_id=user_id,
             session_id=session_id,
-        )
-        return Response(status_code=204)  # No content response
+            on_complete=save_reply,
+            on_error=save_query_only,
+        ):
+            yield orjson.dumps({"type": "delta", "text": chunk}) + b"\n"
+        yield orjson.dumps({"type": "final", "user_id": "bot", "name": "Burpla", **saved}) + b"\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
@@ -1,21 +1,13 @@
 from fastapi import APIRouter
-from fastapi import HTTPException, Query, Body
-import os, json, uuid
-
-from agent_gadk.orchestrator import run_conversation
-from db_services.chat import ChatManager
-from db_services.user import UserManager
-from db_services.session import SessionManager
-from fastapi.responses import Response
-from tools.google_map import plot_named_locations_googlemap
+from fastapi import HTTPException, Query
+import uuid
+
+from db_services.managers import user_manager, chat_manager, session_manager
 from base_models.db_models import CreateSessionRequest, UpdateSessionRequest, JoinSessionRequest
+from config import CHAT_HISTORY_MAX_MESSAGES
 import logging
 logger = logging.getLogger(__name__)
 
-user_manager = UserManager()
-chat_manager = ChatManager()
-session_manager = SessionManager()
-
 router = APIRouter(
     prefix="/session",
     tags=["session"],
@@ -37,8 +29,8 @@ async def get_conversation_session(session_id: str = Query(..., example="session
     # First check if session exists in convo table
     convo = session_manager.get(session_id)
 
-    # Get all messages for the session
-    all_messages = chat_manager.load_chat_history(session_id)
+    # Get the newest messages for the session (bounded so long chats stay cheap to open)
+    all_messages = chat_manager.load_chat_history(session_id, recent=CHAT_HISTORY_MAX_MESSAGES)
 
     # If session doesn't exist in convo table and has no messages, return 404
     if not convo and not all_messages:
@@ -46,10 +38,8 @@ async def get_conversation_session(session_id: str = Query(..., example="session
 
     # If session exists in convo but has no messages, initialize it
     if convo and not all_messages:
-        # Initialize chat session (creates a bot welcome message)
-        chat_manager.initialize_chat_session(session_id)
-        # Reload messages after initialization
-        all_messages = chat_manager.load_chat_history(session_id)
+        # Initialize chat session (creates a bot welcome message and returns the messages)
+        all_messages = chat_manager.initialize_chat_session(session_id)
 
     # Get session members to filter messages
     session_member_ids = set()
@@ -1,17 +1,10 @@
 from fastapi import APIRouter
-from fastapi import FastAPI, HTTPException, Query, Body
-from agent_gadk.orchestrator import run_conversation
-from db_services.chat import ChatManager
-from db_services.user import UserManager
-from db_services.session import SessionManager
+from fastapi import HTTPException, Query
+from db_services.managers import user_manager
 from base_models.db_models import UserInfo
 import logging
 logger = logging.getLogger(__name__)
 
-user_manager = UserManager()
-chat_manager = ChatManager()
-session_manager = SessionManager()
-
 router = APIRouter(
     prefix="/user",
     tags=["user"],
@@ -0,0 +1,42 @@
+import pytest
+
+from db_services.chat import ChatManager
+
+
+@pytest.fixture
+def chat_manager(tmp_path):
+    manager = ChatManager(str(tmp_path / "test.db"))
+    manager.save_chat_messages([
+        {"session_id": "s1", "user_id": "bot", "message_id": f"m{i}", "content": f"message {i}"}
+        for i in range(1, 4)
+    ])
+    return manager
+
+
+def test_after_message_id_returns_newer_messages(chat_manager):
+    history = chat_manager.load_chat_history("s1", after_message_id="m1")
+    assert [m["message_id"] for m in history] == ["m2", "m3"]
+
+
+def test_after_latest_message_id_is_empty(chat_manager):
+    assert chat_manager.load_chat_history("s1", after_message_id="m3") == []
+
+
+def test_unknown_after_message_id_raises(chat_manager):
+    with pytest.raises(ValueError):
+        chat_manager.load_chat_history("s1", after_message_id="missing")
+    # An anchor from another session is just as stale
+    with pytest.raises(ValueError):
+        chat_manager.load_chat_history("s2", after_message_id="m1")
+
+
+def test_batched_messages_keep_order_and_given_timestamp(chat_manager):
+    chat_manager.save_chat_messages([
+        {"session_id": "s1", "user_id": "bot", "message_id": "q", "content": "query",
+         "timestamp": "2025-01-01T00:00:00"},
+        {"session_id": "s1", "user_id": "bot", "message_id": "r", "content": "reply"},
+    ])
+    query, reply = chat_manager.load_chat_history("s1", after_message_id="m3")
+    assert (query["message_id"], reply["message_id"]) == ("q", "r")
+    assert query["timestamp"] == "2025-01-01T00:00:00"
+    assert reply["timestamp"] > query["timestamp"]
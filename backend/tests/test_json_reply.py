@@ -0,0 +1,89 @@
+import pytest
+
+from agent_gadk.json_reply import (
+    SOURCE_ORJSON,
+    SOURCE_REPAIRED,
+    SOURCE_STREAM,
+    is_valid_card,
+    looks_like_json,
+    parse_json_reply,
+    strip_json_fences,
+)
+from agent_gadk.json_stream import IncrementalJsonParser
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('  {"a": 1}', True),
+    ("[1]", True),
+    ("\n```JSON\n{}\n```", True),
+    ("Here are some places", False),
+    (None, False),
+])
+def test_looks_like_json(text, expected):
+    assert looks_like_json(text) is expected
+
+
+@pytest.mark.parametrize("text", [
+    '```json\n{"a": 1}\n```',
+    '```json{"a": 1}```',
+    '  {"a": 1}  ',
+])
+def test_strip_json_fences(text):
+    assert strip_json_fences(text) == '{"a": 1}'
+
+
+def test_streamed_parser_value_is_used():
+    parser = IncrementalJsonParser()
+    parser.feed('{"type": "vote_card"}')
+    parsed = parse_json_reply("ignored when the parser holds a value", parser=parser)
+    assert parsed.data == {"type": "vote_card"}
+    assert parsed.source == SOURCE_STREAM
+
+
+def test_full_text_is_parsed_with_orjson():
+    parsed = parse_json_reply('```json\n{"type": "vote_card", "n": [1, 2]}\n```')
+    assert parsed.data == {"type": "vote_card", "n": [1, 2]}
+    assert parsed.source == SOURCE_ORJSON
+
+
+def test_clean_object_followed_by_prose_is_not_repaired():
+    parsed = parse_json_reply('{"a": 1} Enjoy!')
+    assert parsed.data == {"a": 1}
+    assert parsed.source == SOURCE_ORJSON
+
+
+def test_truncated_reply_is_repaired():
+    parsed = parse_json_reply('```json\n{"type": "vote_card", "vote_options": [{"restaurant_id": "a"}, {"restau')
+    assert parsed.source == SOURCE_REPAIRED
+    # The cut-off option survives as an empty object; is_valid_card is what rejects it
+    assert parsed.data["vote_options"] == [{"restaurant_id": "a"}, {}]
+
+
+def test_unrecoverable_reply_returns_none():
+    assert parse_json_reply("```json\nnot json at all") is None
+
+
+def _vote_card(**overrides):
+    card = {
+        "message_id": "msm_1",
+        "sender_name": "Burpla",
+        "type": "vote_card",
+        "vote_options": [{"restaurant_id": "ChIJ123", "restaurant_name": "Sushi Zen"}],
+    }
+    card.update(overrides)
+    return card
+
+
+def test_is_valid_card_accepts_complete_cards():
+    pytest.importorskip("pydantic")
+    assert is_valid_card(_vote_card())
+    assert is_valid_card({"type": "recommendation_card", "options": []})
+
+
+def test_is_valid_card_rejects_partial_or_unknown_cards():
+    pytest.importorskip("pydantic")
+    # An option cut off before its required restaurant_id
+    assert not is_valid_card(_vote_card(vote_options=[{"restaurant_name": "Sushi Zen"}]))
+    assert not is_valid_card({"type": "vote_card"})
+    assert not is_valid_card({"type": "something_else"})
+    assert not is_valid_card(["ChIJ123"])
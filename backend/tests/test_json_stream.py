@@ -0,0 +1,93 @@
+import pytest
+
+from agent_gadk.json_stream import IncrementalJsonParser
+
+
+def _feed(text, chunk_size=None):
+    parser = IncrementalJsonParser()
+    if chunk_size is None:
+        parser.feed(text)
+    else:
+        for i in range(0, len(text), chunk_size):
+            parser.feed(text[i:i + chunk_size])
+    return parser
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 3])
+def test_complete_document_is_parsed_while_streaming(chunk_size):
+    parser = _feed('{"type": "vote_card", "vote_options": [{"id": 1}, {"id": 2}]}', chunk_size)
+    assert parser.value == {"type": "vote_card", "vote_options": [{"id": 1}, {"id": 2}]}
+    assert parser.finalize() == parser.value
+    assert parser.repaired is False
+
+
+def test_fenced_input_skips_fence_text():
+    parser = _feed('```json\n{"a": [1, 2]}\n```')
+    assert parser.value == {"a": [1, 2]}
+    assert parser.text() == '{"a": [1, 2]}'
+
+
+def test_trailing_prose_is_not_a_clean_value():
+    parser = _feed('{"a": 1} Let me know if you want more!')
+    assert parser.value is None
+    # The document itself is still intact
+    assert parser.finalize() == {"a": 1}
+    assert parser.repaired is False
+
+
+def test_escaped_quotes_and_brackets_inside_strings():
+    text = '{"name": "Luigi\\"s {Trattoria} [x]", "ok": true}'
+    parser = _feed(text, 1)
+    assert parser.value == {"name": 'Luigi"s {Trattoria} [x]', "ok": True}
+
+
+def test_escaped_backslash_before_closing_quote():
+    parser = _feed('{"path": "C:\\\\", "n": 1}', 1)
+    assert parser.value == {"path": "C:\\", "n": 1}
+
+
+def test_truncated_string_is_closed_and_marked_repaired():
+    parser = _feed('{"type": "vote_card", "name": "Sushi Z')
+    assert parser.value is None
+    assert parser.finalize() == {"type": "vote_card", "name": "Sushi Z"}
+    assert parser.repaired is True
+
+
+def test_truncated_key_falls_back_to_last_complete_value():
+    parser = _feed('{"a": 1, "bro')
+    assert parser.finalize() == {"a": 1}
+    assert parser.repaired is True
+
+
+def test_dangling_colon_is_completed_with_null():
+    parser = _feed('{"a": 1, "b":')
+    assert parser.finalize() == {"a": 1, "b": None}
+    assert parser.repaired is True
+
+
+def test_dangling_comma_is_dropped():
+    parser = _feed('{"items": [1, 2,')
+    assert parser.finalize() == {"items": [1, 2]}
+    assert parser.repaired is True
+
+
+def test_truncated_nested_containers_are_closed():
+    parser = _feed('{"vote_options": [{"id": "a"}, {"id": "b", "rating": 4.')
+    data = parser.finalize()
+    assert data["vote_options"][0] == {"id": "a"}
+    assert parser.repaired is True
+
+
+def test_no_json_raises():
+    parser = _feed("Sorry, I could not find any restaurants.")
+    assert parser.value is None
+    with pytest.raises(ValueError):
+        parser.finalize()
+
+
+def test_reset_forgets_previous_turn():
+    parser = _feed('{"a": ')
+    parser.reset()
+    parser.feed('[1, 2]')
+    assert parser.value == [1, 2]
+    assert parser.repaired is False
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("cachetools")
+
+from db_services.session import SessionManager
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return SessionManager(str(tmp_path / "test.db"), enable_cache=False)
+
+
+def test_join_normalizes_spaced_member_list(sessions):
+    sessions.add_session("s1", "Lunch", "a", " a, b ")
+    assert sessions.join_session("s1", "c")
+    assert sessions.get("s1")["member_id_list"] == "a,b,c"
+
+
+def test_join_existing_member_is_a_no_op(sessions):
+    sessions.add_session("s1", "Lunch", "a", "a, b")
+    assert sessions.join_session("s1", "b")
+    assert sessions.get("s1")["member_id_list"] == "a, b"
+
+
+def test_join_empty_and_missing_sessions(sessions):
+    sessions.add_session("s1", "Lunch", "a", "  ")
+    assert sessions.join_session("s1", "a")
+    assert sessions.get("s1")["member_id_list"] == "a"
+    assert not sessions.join_session("missing", "a")
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from agent_gadk.session_trim import is_recommendation_card, trim_to_recent_turns
+
+_CARD = '{"type": "recommendation_card", "options": [{"restaurant_id": "ChIJ123"}]}'
+
+
+def _event(author, text=None):
+    parts = [SimpleNamespace(text=text)] if text is not None else []
+    return SimpleNamespace(author=author, content=SimpleNamespace(parts=parts), name=text or author)
+
+
+def _turn(query, *replies):
+    return [_event("user", query), *replies]
+
+
+def _search_turn(query):
+    # A tool-heavy turn: several model/tool events for one user message
+    return _turn(query, *[_event("root_agent") for _ in range(6)], _event("root_agent", "Here you go"))
+
+
+def _names(events):
+    return [e.name for e in events]
+
+
+def test_window_counts_user_turns_not_events():
+    events = _search_turn("q1") + _search_turn("q2") + _search_turn("q3")
+    kept = trim_to_recent_turns(events, 2)
+    assert kept == events[8:]
+    assert kept[0].name == "q2"
+
+
+def test_fewer_turns_than_the_limit_keeps_everything_from_the_first_query():
+    # A turn cut off by the read window is dropped rather than sent half
+    events = [_event("root_agent", "tail of an older turn")] + _search_turn("q1")
+    assert trim_to_recent_turns(events, 5) == events[1:]
+
+
+def test_recommendation_card_before_the_cut_is_kept():
+    card_turn = _turn("find sushi", _event("root_agent"), _event("pipeline_recommendation_agent", _CARD))
+    events = card_turn + _search_turn("q2") + _search_turn("q3") + _search_turn("q4")
+    kept = trim_to_recent_turns(events, 2)
+    assert _names(kept[:2]) == ["find sushi", _CARD]
+    assert kept[2:] == events[-16:]
+
+
+def test_only_the_newest_card_is_kept():
+    old = _turn("old", _event("pipeline_recommendation_agent", _CARD.replace("ChIJ123", "old")))
+    new = _turn("new", _event("pipeline_recommendation_agent", _CARD))
+    events = old + new + _search_turn("q3") + _search_turn("q4")
+    kept = trim_to_recent_turns(events, 2)
+    assert _names(kept[:2]) == ["new", _CARD]
+    assert len(kept) == 2 + 16
+
+
+def test_card_inside_the_window_is_not_duplicated():
+    events = _search_turn("q1") + _turn("find sushi", _event("pipeline_recommendation_agent", _CARD))
+    assert trim_to_recent_turns(events, 1) == events[-2:]
+
+
+def test_is_recommendation_card():
+    assert is_recommendation_card(_event("pipeline_recommendation_agent", _CARD))
+    assert not is_recommendation_card(_event("root_agent", "recommendation_card"))
+    assert not is_recommendation_card(_event("root_agent"))
@@ -1,10 +1,32 @@
-import googlemaps
-import os
-from dotenv import load_dotenv
-
-load_dotenv(override=True)
-
-def plot_named_locations_googlemap(users_location, places_location):
+import asyncio
+import logging
+import httpx
+from config import GOOGLE_API_KEY
+
+logger = logging.getLogger(__name__)
+
+_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# Shared HTTP/2 client: all geocodes for a map go out concurrently over pooled connections
+_HTTP = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(8.0, connect=2.0),
+    limits=httpx.Limits(max_keepalive_connections=20),
+)
+
+async def _geocode_address(address):
+    try:
+        response = await _HTTP.get(_GEOCODE_URL, params={"address": address, "key": GOOGLE_API_KEY})
+        response.raise_for_status()
+        results = response.json().get("results")
+        if results:
+            loc = results[0]["geometry"]["location"]
+            return (loc["lat"], loc["lng"])
+    except (httpx.HTTPError, ValueError, KeyError) as e:
+        logger.warning("Error geocoding %s: %s", address, e)
+    return None
+
+async def plot_named_locations_googlemap(users_location, places_location):
     """
     Plot user and place locations on a REAL Google Map (JS API), with:
       - Auto-zoom to fit all points
@@ -14,47 +36,28 @@ def plot_named_locations_googlemap(users_location, places_location):
     Args:
         users_location (list[dict]): [{'user_name': str, 'address': str}, ...]
         places_location (list[dict]): [{'place_name': str, 'address': str}, ...]
-        api_key (str): Google Maps API key
-        output_file (str): HTML file path
 
     Returns:
         str: HTML string of the rendered map
     """
 
-    api_key=os.getenv("GOOGLE_API_KEY")
-    gmaps = googlemaps.Client(key=api_key)
-
-    def geocode_address(address):
-        try:
-            result = gmaps.geocode(address)
-            if result:
-                loc = result[0]["geometry"]["location"]
-                return (loc["lat"], loc["lng"])
-        except Exception as e:
-            print(f"Error geocoding {address}: {e}")
-        return None
-
-    # Geocode users
-    geocoded_users = []
-    for u in users_location:
-        coord = geocode_address(u.address)  # Use attribute-style access
-        if coord:
-            geocoded_users.append({
-                "name": u.user_name,  # Use attribute-style access
-                "address": u.address,
-                "coord": coord
-            })
-
-    # Geocode places
-    geocoded_places = []
-    for p in places_location:
-        coord = geocode_address(p.address)  # Use attribute-style access
-        if coord:
-            geocoded_places.append({
-                "name": p.place_name,  # Use attribute-style access
-                "address": p.address,
-                "coord": coord
-            })
+    # Geocode users and places in one concurrent batch
+    coords = await asyncio.gather(
+        *(_geocode_address(u.address) for u in users_location),  # Use attribute-style access
+        *(_geocode_address(p.address) for p in places_location),
+    )
+    user_coords, place_coords = coords[:len(users_location)], coords[len(users_location):]
+
+    geocoded_users = [
+        {"name": u.user_name, "address": u.address, "coord": coord}
+        for u, coord in zip(users_location, user_coords)
+        if coord
+    ]
+    geocoded_places = [
+        {"name": p.place_name, "address": p.address, "coord": coord}
+        for p, coord in zip(places_location, place_coords)
+        if coord
+    ]
 
     if not geocoded_users and not geocoded_places:
         raise ValueError("No valid coordinates found.")
@@ -154,7 +157,7 @@ def plot_named_locations_googlemap(users_location, places_location):
                 }});
             }}
         </script>
-        <script async defer src="https://maps.googleapis.com/maps/api/js?key={api_key}&callback=initMap"></script>
+        <script async defer src="https://maps.googleapis.com/maps/api/js?key={GOOGLE_API_KEY}&callback=initMap"></script>
     </body>
     </html>
     """
@@ -175,7 +178,7 @@ if __name__ == "__main__":
         {"place_name": "Chicha San Chen", "address": "9750 Bellaire Blvd, Houston, TX 77036"},
     ]
 
-    html = plot_named_locations_googlemap(users_location, places_location)
+    html = asyncio.run(plot_named_locations_googlemap(users_location, places_location))
         # Save HTML
     
     output_file="google_map.html"